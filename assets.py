@@ -0,0 +1,75 @@
+import pygame as pg
+
+
+class Assets:
+    # Loads and scales every image once, then hands out the same surfaces and masks to every sprite
+    def __init__(self):
+        self.images = {}
+        self.masks = {}
+        self.rotations = {}
+        # Masks built so far, only grows on cache misses
+        self.mask_builds = 0
+
+    def image(self, path, size=None, color=None):
+        # size scales the image, color fills a copy of it with a flat color
+        key = (path, size, color)
+        if key not in self.images:
+            if color is not None:
+                image = self.image(path, size).copy()
+                image.fill(color)
+            elif size is not None:
+                image = pg.transform.scale(self.image(path), size)
+            else:
+                image = pg.image.load(path)
+            self.images[key] = image
+        return self.images[key]
+
+    def mask(self, path, size=None):
+        key = (path, size)
+        if key not in self.masks:
+            self.masks[key] = pg.mask.from_surface(self.image(path, size))
+            self.mask_builds += 1
+        return self.masks[key]
+
+    def orientations(self, path, step, size=None, color=None):
+        key = (path, step, size, color)
+        if key not in self.rotations:
+            self.rotations[key] = Orientation_Cache(self.image(path, size, color), step)
+            self.mask_builds += self.rotations[key].count
+        return self.rotations[key]
+
+
+class Orientation_Cache:
+    # Rotated image, mask, footprint and top left offset from the center for every
+    # multiple of step degrees, so turning sprites only look them up
+    def __init__(self, pic, step):
+        self.step = step
+        self.count = int(round(360/step))
+        self.images = []
+        self.masks = []
+        self.footprints = []
+        self.offsets = []
+        self.directions = []
+        for k in range(self.count):
+            angle = k*step
+            image = pg.transform.rotate(pic, angle)
+            w, h = image.get_size()
+            self.images.append(image)
+            self.masks.append(pg.mask.from_surface(image))
+            # Same bits as the mask, as a numpy array indexed [y, x]
+            self.footprints.append(pg.surfarray.array_alpha(image).T > 127)
+            # Same corner as image.get_rect(center=...).topleft
+            self.offsets.append((-(w//2), -(h//2)))
+            # Unit vector the sprite points at, shared between sprites so never modify it
+            self.directions.append(pg.math.Vector2(1.0, 0.0).rotate(-angle))
+
+    def index(self, angle):
+        return int(round(angle/self.step)) % self.count
+
+    def lookup(self, angle):
+        # (image, mask, offset) for the nearest cached angle
+        k = self.index(angle)
+        return self.images[k], self.masks[k], self.offsets[k]
+
+
+ASSETS = Assets()
@@ -0,0 +1,262 @@
+import argparse
+import json
+import os
+import platform
+import time
+import numpy as np
+import pygame as pg
+import neuralnet as nn
+import engine
+import main
+from population import Population
+
+SIZES = (40, 200, 1000, 10000)
+TRACKS = (1, 2)
+# Seconds each measurement keeps repeating for. At least one repetition always runs: a sprite
+# generation of 1000 cars takes about a minute and an engine batch of random genomes often
+# drives the whole 60 s, up to a minute as well, so a full run takes far longer than this
+BUDGET = 2.0
+SPRITE_MAX_SIZE = 1000  # Larger sizes skip the sprite paths, one repetition would take many minutes
+BENCH_PATH = 'benchmark.json'
+
+
+def measure(run, work, budget=BUDGET):
+    # Calls run() until budget seconds passed, returns (rate of work units per second, seconds, repetitions)
+    repetitions = 0
+    start = time.perf_counter()
+    while True:
+        run()
+        repetitions += 1
+        seconds = time.perf_counter() - start
+        if seconds >= budget:
+            return work*repetitions/seconds, seconds, repetitions
+
+
+def free_poses(data, size, rng):
+    # (x, y, heading) anywhere a car's footprint misses the track lines, so rays and
+    # footprints land on every part of the track instead of all on the start pose
+    ys, xs = np.nonzero(~np.asarray(data.track))
+    poses = [np.empty(0, dtype=np.int64)]*3
+    while poses[0].size < size:
+        k = rng.integers(0, xs.size, size)
+        heading = rng.integers(0, data.orientations.count, size)
+        free = ~data.collisions.collide_centered(xs[k], ys[k], heading)
+        poses = [np.concatenate((p, v[free])) for p, v in zip(poses, (xs[k], ys[k], heading))]
+    return [p[:size] for p in poses]
+
+
+def sprite_cars(poses, rng):
+    cars = pg.sprite.Group()
+    still = np.zeros(4, dtype=np.float32)
+    for x, y, heading in zip(*poses):
+        car = main.Car(float(x), float(y), rng)
+        car.orient(int(heading))
+        # One tick standing still centers the rect and lays out the sensor sprites
+        car.controls = still
+        car.update()
+        car.controls = None
+        cars.add(car)
+    return cars
+
+
+def engine_cars(poses):
+    cars = Population(len(poses[0]), main.CAR_X, main.CAR_Y)
+    cars.place(*poses)
+    return cars
+
+
+# Every benchmark takes (track_n, size, rng, budget) and returns (rate, seconds, repetitions).
+# Cars of both paths start from the same free_poses for the same seed
+def car_ticks_sprite(track_n, size, rng, budget):
+    cars = sprite_cars(free_poses(engine.Track_Data(track_n), size, rng), rng)
+    return measure(cars.update, size, budget)
+
+
+def car_ticks_engine(track_n, size, rng, budget):
+    cars = engine_cars(free_poses(engine.Track_Data(track_n), size, rng))
+    outputs = rng.random((size, 4)) < 0.5
+    return measure(lambda: cars.update(outputs), size, budget)
+
+
+def sensors_sprite(track_n, size, rng, budget):
+    # One evaluation is one sensor's distance, Car has 3
+    sim = main.Simulation(0, track_n=track_n)
+    cars = list(sprite_cars(free_poses(engine.Track_Data(track_n), size, rng), rng))
+
+    def run():
+        for car in cars:
+            sim.sense(car)
+    return measure(run, 3*size, budget)
+
+
+def sensors_engine(track_n, size, rng, budget):
+    data = engine.Track_Data(track_n)
+    cars = engine_cars(free_poses(data, size, rng))
+    return measure(lambda: data.sensors.sense(cars), data.sensors.angles.size*size, budget)
+
+
+def collisions_sprite(track_n, size, rng, budget):
+    # pg.sprite.collide_mask per car, like Simulation.step does
+    sim = main.Simulation(0, track_n=track_n)
+    cars = list(sprite_cars(free_poses(engine.Track_Data(track_n), size, rng), rng))
+    return measure(lambda: [pg.sprite.collide_mask(car, sim.track) for car in cars], size, budget)
+
+
+def collisions_kernel(track_n, size, rng, budget):
+    data = engine.Track_Data(track_n)
+    cars = engine_cars(free_poses(data, size, rng))
+    cx, cy = cars.centers()
+    return measure(lambda: data.collisions.collide_centered(cx, cy, cars.heading), size, budget)
+
+
+def forward_layers(track_n, size, rng, budget):
+    # Layer_Dense + Activation_ReLU per car, like Car.update did
+    layers = [(nn.Layer_Dense(4, main.LAYER_NEURONS, 0.01, 0.001, rng), nn.Activation_ReLU(),
+               nn.Layer_Dense(main.LAYER_NEURONS, 4, 0.01, 0.001, rng), nn.Activation_ReLU())
+              for _ in range(size)]
+    inputs = rng.random((size, 1, 4)).astype(np.float32)*main.SENS_LEN
+
+    def run():
+        for (dense1, activation1, dense2, activation2), x in zip(layers, inputs):
+            dense1.forward(x)
+            activation1.forward(dense1.output)
+            dense2.forward(activation1.output)
+            activation2.forward(dense2.output)
+    return measure(run, size, budget)
+
+
+def forward_inference(track_n, size, rng, budget):
+    # Car's allocation free path, still one call per car
+    networks = [nn.Inference_Network([nn.Layer_Dense(4, main.LAYER_NEURONS, 0.01, 0.001, rng),
+                                      nn.Layer_Dense(main.LAYER_NEURONS, 4, 0.01, 0.001, rng)])
+                for _ in range(size)]
+    for network in networks:
+        network.inputs[...] = rng.random(4)*main.SENS_LEN
+
+    def run():
+        for network in networks:
+            network.forward()
+    return measure(run, size, budget)
+
+
+def forward_population(track_n, size, rng, budget):
+    network = nn.Population_Network(size, engine.LAYER_SIZES, 0.01, 0.001, rng)
+    inputs = rng.random((size, 4))*main.SENS_LEN
+    return measure(lambda: network.forward(inputs), size, budget)
+
+
+# Simulation ends a generation for the whole population, Engine times out every car on its
+# own, so generations are not comparable. Both count the ticks their cars drove instead
+def driving_sprite(track_n, size, rng, budget):
+    sim = main.Simulation(int(rng.integers(2**31)), track_n=track_n, size=size)
+    car_ticks = [0]
+
+    def run():
+        generation = sim.generation
+        while sim.generation == generation:
+            car_ticks[0] += len(sim.cars)
+            sim.step()
+    rate, seconds, repetitions = measure(run, 1, budget)
+    return car_ticks[0]/main.TICK_RATE/seconds, seconds, repetitions
+
+
+def driving_engine(track_n, size, rng, budget, max_ticks=None):
+    data = engine.Track_Data(track_n)
+    if max_ticks is None:
+        max_ticks = 60*main.TICK_RATE
+    genomes = [engine.random_genome(rng) for _ in range(size)]
+    car_ticks = [0]
+
+    def run():
+        batch = engine.Engine(data, genomes)
+        while batch.tick < max_ticks and not batch.cars.crashed.all():
+            car_ticks[0] += batch.size - int(batch.cars.crashed.sum())
+            batch.step()
+    rate, seconds, repetitions = measure(run, 1, budget)
+    return car_ticks[0]/main.TICK_RATE/seconds, seconds, repetitions
+
+
+BENCHMARKS = {
+    # name: (unit, {implementation: function})
+    'car_ticks': ('car-ticks/s', {'sprite': car_ticks_sprite, 'engine': car_ticks_engine}),
+    'sensor_evals': ('sensor evaluations/s', {'sprite': sensors_sprite, 'engine': sensors_engine}),
+    'collisions': ('collision tests/s', {'sprite': collisions_sprite, 'kernel': collisions_kernel}),
+    'forward_passes': ('forward passes/s', {'layers': forward_layers, 'inference': forward_inference,
+                                            'population': forward_population}),
+    'driving': ('simulated car-seconds/s', {'sprite': driving_sprite, 'engine': driving_engine}),
+}
+
+
+def environment():
+    return {
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pygame': pg.version.ver,
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def run(benchmarks=tuple(BENCHMARKS), paths=None, tracks=TRACKS, sizes=SIZES, budget=BUDGET, seed=0,
+        sprite_max_size=SPRITE_MAX_SIZE):
+    # Results as a list of dicts, every measurement starts from its own seeded Generator
+    results = []
+    for name in benchmarks:
+        unit, functions = BENCHMARKS[name]
+        for path, function in functions.items():
+            if paths and path not in paths:
+                continue
+            for track_n in tracks:
+                for size in sizes:
+                    if path == 'sprite' and size > sprite_max_size:
+                        continue
+                    rng = np.random.default_rng(seed)
+                    rate, seconds, repetitions = function(track_n, size, rng, budget)
+                    results.append({'benchmark': name, 'path': path, 'track': track_n, 'size': size,
+                                    'rate': rate, 'unit': unit, 'seconds': seconds,
+                                    'repetitions': repetitions})
+                    print(f'{name:>14} {path:>10} track{track_n} {size:>6}: {rate:14.1f} {unit}')
+    return results
+
+
+def save(path, results, budget=BUDGET, seed=0):
+    report = {'environment': environment(), 'budget': budget, 'seed': seed, 'results': results}
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=1)
+
+
+def compare(old_path, new_path):
+    # Ratio new/old of every measurement the two reports share, below 1 is a regression
+    with open(old_path) as f:
+        old = {(r['benchmark'], r['path'], r['track'], r['size']): r['rate'] for r in json.load(f)['results']}
+    with open(new_path) as f:
+        new = json.load(f)['results']
+    ratios = {}
+    for r in new:
+        key = (r['benchmark'], r['path'], r['track'], r['size'])
+        if key in old and old[key] > 0:
+            ratios[key] = r['rate']/old[key]
+            print(f'{key[0]:>14} {key[1]:>10} track{key[2]} {key[3]:>6}: {ratios[key]:6.2f}x')
+    return ratios
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Throughput of the simulation, sensors, networks and evolution')
+    parser.add_argument('--benchmarks', nargs='+', choices=list(BENCHMARKS), default=list(BENCHMARKS))
+    parser.add_argument('--paths', nargs='+', help='only these implementations, e.g. sprite engine')
+    parser.add_argument('--tracks', nargs='+', type=int, default=list(TRACKS))
+    parser.add_argument('--sizes', nargs='+', type=int, default=list(SIZES))
+    parser.add_argument('--budget', type=float, default=BUDGET, help='seconds per measurement')
+    parser.add_argument('--sprite-max-size', type=int, default=SPRITE_MAX_SIZE,
+                        help='largest size the sprite paths are measured at')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', default=BENCH_PATH)
+    parser.add_argument('--compare', metavar='OLD', help='print new/old rate ratios against an older report')
+    args = parser.parse_args()
+    results = run(args.benchmarks, args.paths, args.tracks, args.sizes, args.budget, args.seed,
+                  args.sprite_max_size)
+    save(args.out, results, args.budget, args.seed)
+    if args.compare:
+        compare(args.compare, args.out)
@@ -0,0 +1,111 @@
+import json
+import os
+import threading
+import numpy as np
+
+FORMAT_VERSION = 1
+BRAIN_PATH = 'best_brain.npz'
+ARCHIVE_PATH = 'best_brain.archive.npz'  # Snapshots never overwrite the full precision brain
+ARCHIVE_DTYPE = np.float16  # Periodic snapshots are only archives, half size is plenty
+
+
+def get_rng_state(rng=None):
+    # JSON friendly state of a np.random.Generator, or of the global np.random state when rng is None
+    if rng is not None:
+        return {'generator': rng.bit_generator.state}
+    name, keys, pos, has_gauss, cached_gaussian = np.random.get_state()
+    return {'legacy': [name, keys.tolist(), int(pos), int(has_gauss), float(cached_gaussian)]}
+
+
+def set_rng_state(state, rng=None):
+    # Puts a saved state back into rng, or into the global np.random state
+    if state is None:
+        return
+    if 'generator' in state and rng is not None:
+        rng.bit_generator.state = state['generator']
+    elif 'legacy' in state:
+        name, keys, pos, has_gauss, cached_gaussian = state['legacy']
+        np.random.set_state((name, np.array(keys, dtype=np.uint32), pos, has_gauss, cached_gaussian))
+
+
+def save(path, genomes, generation=0, rng=None, hyperparameters=None, fitness=None, dtype=None):
+    # genomes is a list of [w1, b1, w2, b2, ...], stored stacked as param0..paramN of shape (pop, ...)
+    # in an uncompressed .npz so thousands of genomes load with one read per parameter.
+    # rng is a get_rng_state() dict, dtype is the storage dtype, None keeps the genomes' own
+    meta = {
+        'version': FORMAT_VERSION,
+        'generation': generation,
+        'rng': rng,
+        'hyperparameters': hyperparameters or {},
+    }
+    arrays = {'meta': np.array(json.dumps(meta))}
+    for l in range(len(genomes[0])):
+        arrays['param'+str(l)] = np.stack([genome[l] for genome in genomes])
+        if dtype is not None:
+            arrays['param'+str(l)] = arrays['param'+str(l)].astype(dtype)
+    if fitness is not None:
+        arrays['fitness'] = np.asarray(fitness)
+    # Write then rename, a crash mid write never leaves a broken brain behind
+    temp_path = path+'.tmp.npz'
+    np.savez(temp_path, **arrays)
+    os.replace(temp_path, path)
+
+
+def load(path, dtype=np.float32):
+    # Returns (params, meta), params are the stacked arrays, params[l][i] is layer value l of genome i.
+    # Params are cast to dtype so float16 archives come back ready to compute with, None keeps them as stored
+    with np.load(path) as data:
+        meta = json.loads(str(data['meta']))
+        if meta['version'] > FORMAT_VERSION:
+            raise ValueError('Brain file '+path+' has format version ' +
+                             str(meta['version'])+', newest known is '+str(FORMAT_VERSION))
+        count = len([k for k in data.files if k.startswith('param')])
+        params = [data['param'+str(l)] for l in range(count)]
+        if dtype is not None:
+            params = [p.astype(dtype, copy=False) for p in params]
+        if 'fitness' in data.files:
+            meta['fitness'] = data['fitness']
+    return params, meta
+
+
+def genomes(params):
+    # Stacked params back to a list of [w1, b1, w2, b2, ...]
+    return [[p[i] for p in params] for i in range(len(params[0]))]
+
+
+class Snapshotter:
+    # Saves on a background thread so the simulation loop never waits on the disk.
+    # If a save is still running when a new one comes in, only the newest is kept
+    def __init__(self, path=ARCHIVE_PATH, dtype=ARCHIVE_DTYPE):
+        self.path = path
+        self.dtype = dtype
+        self.pending = None
+        self.running = True
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def submit(self, genomes, **kwargs):
+        # Arrays are copied here, the caller may keep mutating its own
+        genomes = [[np.array(v, copy=True) for v in genome] for genome in genomes]
+        with self.condition:
+            self.pending = (genomes, kwargs)
+            self.condition.notify()
+
+    def run(self):
+        while True:
+            with self.condition:
+                while self.pending is None and self.running:
+                    self.condition.wait()
+                if self.pending is None:
+                    return
+                genomes, kwargs = self.pending
+                self.pending = None
+            save(self.path, genomes, dtype=self.dtype, **kwargs)
+
+    def close(self):
+        # Finishes any pending save before returning
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        self.thread.join()
@@ -0,0 +1,162 @@
+import numpy as np
+import masks
+
+MIN_GATE_PIXELS = 50  # Smaller blobs in the checkpoint images are stray paint, not gates
+START_BLOCK = 20  # Road is blocked this far behind the start so distances only grow forward
+
+NEIGHBORS = ((-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1))
+
+
+def grid_bfs(passable, ys, xs):
+    # Steps from the seed pixels to every passable pixel over 8 connected moves, -1 if unreachable
+    h, w = passable.shape
+    pw = w + 2
+    padded = np.zeros((h + 2, pw), dtype=bool)
+    padded[1:-1, 1:-1] = passable
+    flat = padded.ravel()
+    offsets = np.array([dy*pw + dx for dy, dx in NEIGHBORS])
+    distance = np.full(flat.size, -1, dtype=np.int32)
+    frontier = (np.asarray(ys) + 1)*pw + np.asarray(xs) + 1
+    frontier = frontier[flat[frontier]]
+    distance[frontier] = 0
+    step = 0
+    while frontier.size:
+        step += 1
+        around = (frontier[:, None] + offsets).ravel()
+        frontier = np.unique(around[flat[around] & (distance[around] < 0)])
+        distance[frontier] = step
+    return distance.reshape(h + 2, pw)[1:-1, 1:-1]
+
+
+def label_components(mask, min_pixels=MIN_GATE_PIXELS):
+    # 8 connected components of mask as a label map, -1 outside, blobs under min_pixels dropped
+    labels = np.full(mask.shape, -1, dtype=np.int32)
+    remaining = np.array(mask, dtype=bool)
+    count = 0
+    while remaining.any():
+        y, x = np.unravel_index(np.argmax(remaining), mask.shape)
+        component = grid_bfs(remaining, [y], [x]) >= 0
+        remaining &= ~component
+        if component.sum() >= min_pixels:
+            labels[component] = count
+            count += 1
+    return labels, count
+
+
+def start_barrier(track, start, heading, back=START_BLOCK, thickness=3):
+    # Wall across the road behind the start position, wall pixel to wall pixel
+    h, w = track.shape
+    hx, hy = heading
+    barrier = np.zeros_like(track, dtype=bool)
+    for b in range(back, back + thickness):
+        for side in (1, -1):
+            s = 0
+            while True:
+                x = int(round(start[0] - hx*b - hy*s*side))
+                y = int(round(start[1] - hy*b + hx*s*side))
+                if not (0 <= x < w and 0 <= y < h) or track[y, x]:
+                    break
+                barrier[y, x] = True
+                s += 1
+    return barrier
+
+
+def order_gates(checkpoints, track, start, heading=(1.0, 0.0)):
+    # Label map of the checkpoint stripes numbered in driving order, -1 outside them.
+    # Gates are ordered by how far along the road from the start they are first reached
+    labels, count = label_components(checkpoints)
+    road = ~np.asarray(track) & ~start_barrier(track, start, heading)
+    road_distance = grid_bfs(road, [int(start[1])], [int(start[0])])
+    ys, xs = np.nonzero(labels >= 0)
+    gate = labels[ys, xs]
+    reach = road_distance[ys, xs]
+    first = np.full(count, np.iinfo(np.int32).max, dtype=np.int64)
+    np.minimum.at(first, gate[reach >= 0], reach[reach >= 0])
+    reachable = np.flatnonzero(first < np.iinfo(np.int32).max)
+    order = reachable[np.argsort(first[reachable], kind='stable')]
+    relabel = np.full(count + 1, -1, dtype=np.int16)
+    relabel[order] = np.arange(order.size)
+    return relabel[labels]
+
+
+class Gate_Index:
+    # Checkpoint stripes as gates numbered in driving order. The label map is a pixel grid,
+    # so finding the gate under a car is one array read
+    def __init__(self, labels, start):
+        self.labels = labels
+        self.start = np.asarray(start, dtype=np.float64)
+        ys, xs = np.nonzero(np.asarray(labels) >= 0)
+        gate = labels[ys, xs]
+        self.count = int(gate.max()) + 1
+        pixels = np.bincount(gate, minlength=self.count)
+        self.centers = np.stack((np.bincount(gate, xs, self.count)/pixels,
+                                 np.bincount(gate, ys, self.count)/pixels), axis=1)
+
+        # Arc length along the centerline start -> gate 0 -> ... -> last gate -> start
+        points = np.concatenate((self.start[None], self.centers, self.start[None]))
+        lengths = np.sqrt(((points[1:] - points[:-1])**2).sum(axis=1))
+        self.arc = np.concatenate(([0.0], np.cumsum(lengths)))
+        self.lap = self.arc[-1]
+
+    @classmethod
+    def from_track(cls, track_n, start, heading=(1.0, 0.0)):
+        # The ordered label map is cached next to checkpointsN.png, keyed by both images and the start
+        checkpoints_path = 'checkpoints'+str(track_n)+'.png'
+        track_path = 'track'+str(track_n)+'.png'
+        kind = 'gates-'+masks.file_hash(track_path)[:8]+'-'+'-'.join(
+            str(round(v, 3)) for v in (*start, *heading))
+        labels = masks.cached(checkpoints_path, kind, lambda: order_gates(
+            masks.cached_mask(checkpoints_path), masks.cached_mask(track_path), start, heading))
+        return cls(labels, start)
+
+    def lookup(self, x, y):
+        # Gate under each point, -1 for none
+        ix = np.asarray(x).astype(np.int64)
+        iy = np.asarray(y).astype(np.int64)
+        h, w = self.labels.shape
+        inside = (ix >= 0) & (ix < w) & (iy >= 0) & (iy < h)
+        return np.where(inside, self.labels[np.clip(iy, 0, h - 1), np.clip(ix, 0, w - 1)], -1)
+
+    def progress(self, passed, x, y):
+        # Arc length driven from the start in pixels, for cars that passed this many gates.
+        # The position between the last and next gate is projected onto the line joining them
+        passed = np.asarray(passed)
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        laps, gate = np.divmod(passed - 1, self.count)
+        previous = np.where((passed > 0)[..., None], self.centers[gate], self.start)
+        previous_arc = np.where(passed > 0, laps*self.lap + self.arc[gate + 1], 0.0)
+        upcoming = self.centers[passed % self.count]
+        upcoming_arc = np.where(passed > 0, laps*self.lap + self.arc[gate + 2], self.arc[1])
+        # From the last gate the next one is gate 0 of the next lap, through the start
+        upcoming_arc = np.where((passed > 0) & (gate == self.count - 1),
+                                (laps + 1)*self.lap + self.arc[1], upcoming_arc)
+        span = upcoming - previous
+        along = (x - previous[..., 0])*span[..., 0] + (y - previous[..., 1])*span[..., 1]
+        fraction = np.clip(along/np.maximum((span*span).sum(axis=-1), 1e-9), 0.0, 1.0)
+        return previous_arc + fraction*(upcoming_arc - previous_arc)
+
+
+class Gate_Tracker:
+    # Per car gate progress: a car scores by reaching the next gate in order and is
+    # going the wrong way when it touches any gate besides that one and the last it passed
+    def __init__(self, index, size):
+        self.index = index
+        self.passed = np.zeros(size, dtype=np.int64)
+        self.last = np.full(size, -1, dtype=np.int64)
+
+    def update(self, x, y, alive=None):
+        # Returns (scored, wrong_way) masks for this tick
+        gate = self.index.lookup(x, y)
+        on_gate = gate >= 0
+        if alive is not None:
+            on_gate &= alive
+        scored = on_gate & (gate == self.passed % self.index.count)
+        wrong_way = on_gate & ~scored & (gate != self.last)
+        self.passed[scored] += 1
+        self.last[scored] = gate[scored]
+        return scored, wrong_way
+
+    def progress(self, x, y):
+        # Dense fitness, arc length driven by every car
+        return self.index.progress(self.passed, x, y)
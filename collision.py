@@ -0,0 +1,113 @@
+import argparse
+from types import SimpleNamespace
+import numpy as np
+import pygame as pg
+import masks
+
+WORD = 64  # Bits per packed word, footprints up to this wide
+CHUNK = 1024  # Cars per pass, keeps the (cars, rows) temporaries in cache
+
+
+class Collision_Kernel:
+    # Car footprints against the track occupancy grid for a whole population at once, the
+    # same answer pg.sprite.collide_mask gives for each car against the full screen track.
+    # Track rows are packed into 64 bit words and every orientation's footprint rows into one
+    # word each, so a car costs one shifted word pair and an AND per footprint row.
+    # The grid is padded so no pose needs bounds checks
+    def __init__(self, grid, footprints):
+        grid = np.asarray(grid, dtype=bool)
+        self.height, self.width = grid.shape
+        if max(f.shape[1] for f in footprints) > WORD:
+            raise ValueError('Footprints wider than '+str(WORD)+' pixels are not supported')
+        self.rows = max(f.shape[0] for f in footprints)
+        self.heights = np.array([f.shape[0] for f in footprints])
+        self.widths = np.array([f.shape[1] for f in footprints])
+
+        # WORD columns of padding left and right, one footprint height above and below,
+        # and a spare word at the end of each row for the second read of a window
+        self.words = -(-(self.width + 2*WORD)//WORD) + 1
+        padded = np.zeros((self.height + 2*self.rows, self.words*WORD), dtype=bool)
+        padded[self.rows:self.rows + self.height, WORD:WORD + self.width] = grid
+        self.grid = np.packbits(padded, axis=1, bitorder='little').view('<u8').ravel()
+
+        self.bits = np.zeros((len(footprints), self.rows), dtype=np.uint64)
+        for k, footprint in enumerate(footprints):
+            packed = np.zeros((footprint.shape[0], WORD//8), dtype=np.uint8)
+            row_bytes = np.packbits(footprint, axis=1, bitorder='little')
+            packed[:, :row_bytes.shape[1]] = row_bytes
+            self.bits[k, :footprint.shape[0]] = packed.view('<u8')[:, 0]
+
+    @classmethod
+    def from_track(cls, track_n, orientations):
+        # Track mask from the on-disk cache, footprints from an assets.Orientation_Cache
+        return cls(masks.cached_mask('track'+str(track_n)+'.png'), orientations.footprints)
+
+    def collide(self, left, top, heading):
+        # Crash flags for footprints heading placed with their top left corner at (left, top)
+        heading = np.asarray(heading, dtype=np.int64)
+        # Footprints fully outside the grid can only land in the padding
+        x = np.clip(np.asarray(left, dtype=np.int64), -WORD, self.width) + WORD
+        y = np.clip(np.asarray(top, dtype=np.int64), -self.rows, self.height) + self.rows
+        start = y*self.words + x//WORD
+        shift = (x % WORD).astype(np.uint64)
+        hits = np.empty(heading.size, dtype=bool)
+        rows = np.arange(self.rows)*self.words
+        for s in range(0, heading.size, CHUNK):
+            chunk = slice(s, s + CHUNK)
+            index = start[chunk, None] + rows
+            low = np.take(self.grid, index)
+            high = np.take(self.grid, index + 1)
+            # WORD bits of each row starting at x, the high word is shifted in two steps so shift 0 works
+            np.right_shift(low, shift[chunk, None], out=low)
+            np.left_shift(high, np.uint64(1), out=high)
+            np.left_shift(high, np.uint64(WORD - 1) - shift[chunk, None], out=high)
+            np.bitwise_or(low, high, out=low)
+            np.bitwise_and(low, self.bits[heading[chunk]], out=low)
+            hits[chunk] = np.bitwise_or.reduce(low, axis=1) != 0
+        return hits
+
+    def collide_centered(self, cx, cy, heading):
+        # Same with integer centers, placed like image.get_rect(center=...)
+        heading = np.asarray(heading, dtype=np.int64)
+        return self.collide(np.asarray(cx) - self.widths[heading]//2,
+                            np.asarray(cy) - self.heights[heading]//2, heading)
+
+
+def verify(track_n, orientations, samples=20000, rng=None):
+    # Number of random poses where the kernel and pg.sprite.collide_mask disagree. Half the
+    # poses are anywhere around the screen, half right on the track lines where it matters
+    if rng is None:
+        rng = np.random.default_rng()
+    path = 'track'+str(track_n)+'.png'
+    track = SimpleNamespace(mask=pg.mask.from_surface(pg.image.load(path)))
+    track.rect = pg.Rect((0, 0), track.mask.get_size())
+    kernel = Collision_Kernel.from_track(track_n, orientations)
+    w, h = track.rect.size
+    heading = rng.integers(0, orientations.count, samples)
+    left = rng.integers(-WORD - 8, w + 8, samples)
+    top = rng.integers(-WORD - 8, h + 8, samples)
+    ys, xs = np.nonzero(masks.cached_mask(path))
+    near = rng.integers(0, ys.size, samples//2)
+    left[:samples//2] = xs[near] - rng.integers(0, kernel.widths[heading[:samples//2]])
+    top[:samples//2] = ys[near] - rng.integers(0, kernel.heights[heading[:samples//2]])
+
+    hits = kernel.collide(left, top, heading)
+    wrong = 0
+    for k in range(samples):
+        mask = orientations.masks[heading[k]]
+        car = SimpleNamespace(mask=mask, rect=pg.Rect((int(left[k]), int(top[k])), mask.get_size()))
+        wrong += bool(pg.sprite.collide_mask(car, track)) != hits[k]
+    return wrong, int(hits.sum())
+
+
+if __name__ == "__main__":
+    from assets import ASSETS
+    from population import ROTATION_SPEED
+    parser = argparse.ArgumentParser(description='Check the collision kernel against pg.sprite.collide_mask')
+    parser.add_argument('--samples', type=int, default=20000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    orientations = ASSETS.orientations('car.png', ROTATION_SPEED)
+    for track_n in (1, 2):
+        wrong, hits = verify(track_n, orientations, args.samples, np.random.default_rng(args.seed))
+        print(f'track{track_n}: {args.samples} poses, {hits} collisions, {wrong} mismatches')
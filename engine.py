@@ -0,0 +1,95 @@
+import numpy as np
+import neuralnet as nn
+import masks
+import sensors
+import checkpoints
+import collision
+from assets import ASSETS
+from population import Population, ROTATION_SPEED
+from main import TRACK_N, CAR_X, CAR_Y, LAYER_NEURONS, DELTA_TICKS
+
+LAYER_SIZES = [4, LAYER_NEURONS, 4]
+
+
+class Track_Data:
+    # Everything a headless run needs from the track images. Masks are memory mapped
+    # from the on-disk cache, so every process reads the same pages
+    def __init__(self, track_n=TRACK_N):
+        self.track = masks.cached_mask('track'+str(track_n)+'.png')
+        self.gates = checkpoints.Gate_Index.from_track(track_n, (CAR_X, CAR_Y))
+        self.sensors = sensors.Ray_Sensors.from_track(track_n)
+        self.orientations = ASSETS.orientations('car.png', ROTATION_SPEED)
+        self.collisions = collision.Collision_Kernel(self.track, self.orientations.footprints)
+
+
+def random_genome(rng, i_weight=0.01, i_bias=0.001):
+    # [w1, b1, w2, b2] initialized like Car's Layer_Dense pair
+    genome = []
+    for n_inputs, n_neurons in zip(LAYER_SIZES[:-1], LAYER_SIZES[1:]):
+        genome.append(i_weight * rng.standard_normal((n_inputs, n_neurons)))
+        genome.append(i_bias * rng.standard_normal((1, n_neurons)))
+    return genome
+
+
+class Engine:
+    # Vectorized headless run of a batch of genomes. Unlike Simulation every car is
+    # judged on its own (own checkpoint timeout, no highest_score-40 rule), so a
+    # car's score does not depend on which other genomes share its batch.
+    def __init__(self, data, genomes):
+        self.data = data
+        self.size = len(genomes)
+        self.network = nn.Population_Network(self.size, LAYER_SIZES)
+        for i, genome in enumerate(genomes):
+            self.network.set_genome(i, genome)
+        self.cars = Population(self.size, CAR_X, CAR_Y)
+        self.inputs = np.zeros((self.size, 4))
+        self.inputs[:, 1:] = sensors.SENS_MISS
+        # Pointing System
+        self.gates = checkpoints.Gate_Tracker(data.gates, self.size)
+        self.check_tick = np.zeros(self.size, dtype=np.int64)
+        self.tick = 0
+
+    def crash(self, i):
+        self.cars.crashed[i] = True
+        self.cars.accelerate[i] = False
+        self.cars.brake[i] = False
+        self.cars.turn[i] = 0
+
+    def step(self):
+        data = self.data
+        cx, cy = self.cars.centers()
+        alive = np.flatnonzero(~self.cars.crashed)
+        hits = data.collisions.collide_centered(cx[alive], cy[alive], self.cars.heading[alive])
+        for i in alive[hits]:
+            self.crash(i)
+
+        scored, wrong_way = self.gates.update(self.cars.x, self.cars.y, ~self.cars.crashed)
+        self.check_tick[scored] = self.tick
+        for i in np.flatnonzero(wrong_way):
+            self.crash(i)
+
+        # Crash cars that went too long without scoring
+        for i in np.flatnonzero(~self.cars.crashed & (self.check_tick <= self.tick-DELTA_TICKS)):
+            self.crash(i)
+
+        alive = ~self.cars.crashed
+        if alive.any():
+            self.inputs[:, 0] = self.cars.speed
+            # Crashed cars keep their last readings, no rays are cast for them
+            self.inputs[alive, 1:] = data.sensors.sense(self.cars, alive)
+            self.cars.update(self.network.forward(self.inputs, mask=alive))
+        self.tick += 1
+
+    @property
+    def score(self):
+        # Same points as Simulation, 10 per checkpoint
+        return 10*self.gates.passed
+
+    def fitness(self):
+        # Arc length each car drove along the track, in pixels
+        return self.gates.progress(self.cars.x, self.cars.y)
+
+    def run(self, max_ticks):
+        while self.tick < max_ticks and not self.cars.crashed.all():
+            self.step()
+        return self.fitness()
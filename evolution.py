@@ -0,0 +1,295 @@
+import numpy as np
+import neuralnet as nn
+
+DTYPE = np.float32
+
+
+def genome_shapes(layer_sizes):
+    # Shapes of [w1, b1, w2, b2, ...] for Dense layers of these sizes
+    shapes = []
+    for n_inputs, n_neurons in zip(layer_sizes[:-1], layer_sizes[1:]):
+        shapes.append((n_inputs, n_neurons))
+        shapes.append((1, n_neurons))
+    return shapes
+
+
+def flatten(genomes):
+    # List of [w1, b1, w2, b2, ...] to one (pop, params) float32 array
+    return np.stack([np.concatenate([np.ravel(v) for v in genome]) for genome in genomes]).astype(DTYPE)
+
+
+def unflatten(flat, shapes):
+    # (pop, params) array to stacked params, params[l] has shape (pop, *shapes[l]) and is a view of flat
+    params = []
+    start = 0
+    for shape in shapes:
+        size = int(np.prod(shape))
+        params.append(flat[:, start:start + size].reshape((flat.shape[0],) + shape))
+        start += size
+    return params
+
+
+def to_genomes(flat, shapes):
+    # (pop, params) array to a list of [w1, b1, w2, b2, ...]
+    params = unflatten(flat, shapes)
+    return [[p[i] for p in params] for i in range(flat.shape[0])]
+
+
+# Selection, every function returns n parent indices drawn from the population
+def tournament(fitness, n, rng, k=3):
+    entrants = rng.integers(0, fitness.size, (n, k))
+    return entrants[np.arange(n), np.argmax(fitness[entrants], axis=1)]
+
+
+def rank(fitness, n, rng):
+    # Chance grows linearly with rank, the worst member gets the smallest non zero share
+    ranks = np.empty(fitness.size)
+    ranks[np.argsort(fitness, kind='stable')] = np.arange(1, fitness.size + 1)
+    return rng.choice(fitness.size, n, p=ranks/ranks.sum())
+
+
+def truncation(fitness, n, rng, fraction=0.2):
+    top = np.argsort(-fitness, kind='stable')[:max(1, int(fitness.size*fraction))]
+    return rng.choice(top, n)
+
+
+SELECTIONS = {'tournament': tournament, 'rank': rank, 'truncation': truncation}
+
+
+# Crossover, a and b are (n, params) parent arrays
+def uniform_crossover(a, b, rng):
+    return np.where(rng.random(a.shape) < 0.5, a, b)
+
+
+def one_point_crossover(a, b, rng):
+    cut = rng.integers(1, a.shape[1], a.shape[0])
+    return np.where(np.arange(a.shape[1]) < cut[:, None], a, b)
+
+
+def blend_crossover(a, b, rng):
+    t = rng.random((a.shape[0], 1), dtype=DTYPE)
+    return a + t*(b - a)
+
+
+CROSSOVERS = {'uniform': uniform_crossover, 'one_point': one_point_crossover, 'blend': blend_crossover}
+
+
+class Genetic_Algorithm:
+    # Whole population as one (size, params) float32 array. ask() gives the genomes to
+    # evaluate, tell() takes their fitness and breeds the next generation with elitism,
+    # selection, crossover and self adaptive mutation, all vectorized over the population
+    def __init__(self, layer_sizes, size, seed=0, selection='tournament', crossover='uniform',
+                 elites=2, crossover_rate=0.9, sigma=0.05, adaptive=True, i_weight=0.01, i_bias=0.001):
+        if not 0 <= elites < size:
+            raise ValueError('Genetic_Algorithm needs 0 <= elites < size to breed any children, got '
+                             'elites='+str(elites)+', size='+str(size))
+        self.rng = np.random.default_rng(seed)
+        self.shapes = genome_shapes(layer_sizes)
+        self.size = size
+        self.selection = SELECTIONS[selection]
+        self.crossover = CROSSOVERS[crossover]
+        self.elites = elites
+        self.crossover_rate = crossover_rate
+        self.adaptive = adaptive
+        # Each genome carries its own mutation strength when adaptive
+        self.tau = 1/np.sqrt(2*sum(int(np.prod(s)) for s in self.shapes))
+        scales = np.concatenate([np.full(int(np.prod(s)), i_weight if l % 2 == 0 else i_bias, dtype=DTYPE)
+                                 for l, s in enumerate(self.shapes)])
+        self.population = self.rng.standard_normal((size, scales.size), dtype=DTYPE)*scales
+        self.sigma = np.full(size, sigma, dtype=DTYPE)
+        self.generation = 0
+        self.best = self.population[0].copy()
+        self.best_fitness = -np.inf
+
+    def ask(self):
+        return to_genomes(self.population, self.shapes)
+
+    def tell(self, fitness):
+        fitness = np.asarray(fitness, dtype=np.float64)
+        order = np.argsort(-fitness, kind='stable')
+        if fitness[order[0]] >= self.best_fitness:
+            self.best = self.population[order[0]].copy()
+            self.best_fitness = fitness[order[0]]
+
+        n = self.size - self.elites
+        a = self.selection(fitness, n, self.rng)
+        b = self.selection(fitness, n, self.rng)
+        children = self.population[a]
+        crossing = self.rng.random(n) < self.crossover_rate
+        children[crossing] = self.crossover(children[crossing], self.population[b[crossing]], self.rng)
+
+        sigma = self.sigma[a]
+        if self.adaptive:
+            sigma = sigma*np.exp(self.tau*self.rng.standard_normal(n, dtype=DTYPE))
+        children += self.rng.standard_normal(children.shape, dtype=DTYPE)*sigma[:, None]
+
+        self.population = np.concatenate((self.population[order[:self.elites]], children))
+        self.sigma = np.concatenate((self.sigma[order[:self.elites]], sigma))
+        self.generation += 1
+
+    def best_genome(self):
+        return to_genomes(self.best[None], self.shapes)[0]
+
+
+def noise(seed, n):
+    # Perturbation regenerated from its seed, nothing per population member has to be kept
+    return np.random.default_rng(seed).standard_normal(n, dtype=DTYPE)
+
+
+def centered_ranks(fitness):
+    # Fitness shaping, ranks scaled to [-0.5, 0.5] so outliers don't dominate the gradient
+    ranks = np.empty(fitness.size)
+    ranks[np.argsort(fitness, kind='stable')] = np.arange(fitness.size)
+    return ranks/max(fitness.size - 1, 1) - 0.5
+
+
+class Seeded_Genomes:
+    # Read only sequence of genomes theta +- scale*noise(seed), built on access. Only theta,
+    # scale and one (seed, sign) per member are kept, so it pickles in O(params) and worker
+    # processes rebuild their members themselves
+    def __init__(self, theta, scale, seeds, signs, shapes):
+        self.theta = theta
+        self.scale = scale
+        self.seeds = np.asarray(seeds)
+        self.signs = np.asarray(signs)
+        self.shapes = shapes
+
+    def __len__(self):
+        return self.seeds.size
+
+    def __getitem__(self, i):
+        step = self.scale*noise(self.seeds[i], self.theta.size)
+        flat = self.theta + step if self.signs[i] > 0 else self.theta - step
+        return to_genomes(flat.astype(DTYPE)[None], self.shapes)[0]
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def subset(self, indices):
+        # Members at indices, still lazy
+        return Seeded_Genomes(self.theta, self.scale, self.seeds[indices], self.signs[indices], self.shapes)
+
+
+class Flat_Parameters:
+    # Optimizer_SGD only touches weights, biases and their gradients, so a flat vector can stand in for a layer
+    def __init__(self, theta):
+        self.weights = theta
+        self.biases = np.zeros(0, dtype=theta.dtype)
+        self.dweights = np.zeros_like(theta)
+        self.dbiases = np.zeros(0, dtype=theta.dtype)
+
+
+class OpenAI_ES:
+    # Evolution strategies: the gradient of fitness is estimated from antithetic pairs
+    # theta + sigma*eps, theta - sigma*eps and handed to Optimizer_SGD. Only theta, the
+    # optimizer state and one seed per pair are kept, whatever the population size
+    def __init__(self, layer_sizes, size, seed=0, sigma=0.02, learning_rate=0.001, decay=0.,
+                 momentum=0.9, weight_decay=0.005, i_weight=0.01, i_bias=0.001):
+        self.rng = np.random.default_rng(seed)
+        self.shapes = genome_shapes(layer_sizes)
+        if size % 2:
+            raise ValueError('OpenAI_ES evaluates antithetic pairs, size must be even, got '+str(size))
+        self.size = size
+        self.sigma = sigma
+        self.weight_decay = weight_decay
+        scales = np.concatenate([np.full(int(np.prod(s)), i_weight if l % 2 == 0 else i_bias, dtype=DTYPE)
+                                 for l, s in enumerate(self.shapes)])
+        self.params = Flat_Parameters(self.rng.standard_normal(scales.size, dtype=DTYPE)*scales)
+        self.optimizer = nn.Optimizer_SGD(Learning_rate=learning_rate, decay=decay, momentum=momentum)
+        self.seeds = None
+        self.generation = 0
+
+    def ask(self):
+        # Members 2k and 2k+1 are the +eps and -eps sides of pair k
+        self.seeds = self.rng.integers(0, 2**63, self.size//2)
+        return Seeded_Genomes(self.params.weights.copy(), self.sigma, np.repeat(self.seeds, 2),
+                              np.tile([1, -1], self.size//2), self.shapes)
+
+    def tell(self, fitness):
+        shaped = centered_ranks(np.asarray(fitness, dtype=np.float64))
+        gradient = np.zeros_like(self.params.weights)
+        for k, seed in enumerate(self.seeds):
+            gradient += DTYPE(shaped[2*k] - shaped[2*k + 1])*noise(seed, gradient.size)
+        gradient /= self.size*self.sigma
+        # Optimizer_SGD descends, fitness is climbed
+        self.params.dweights[:] = self.weight_decay*self.params.weights - gradient
+        self.optimizer.pre_update_params()
+        self.optimizer.update_params(self.params)
+        self.optimizer.post_update_params()
+        self.generation += 1
+
+    def best_genome(self):
+        return to_genomes(self.params.weights[None], self.shapes)[0]
+
+
+class Sep_CMA_ES:
+    # CMA-ES with a diagonal covariance, O(params) state. Samples are m + sigma*sqrt(C)*z
+    # with z regenerated from per member seeds when the update needs them
+    def __init__(self, layer_sizes, size, seed=0, sigma=0.05, i_weight=0.01, i_bias=0.001):
+        if size < 2:
+            raise ValueError('Sep_CMA_ES recombines the best size//2 members, size must be at least 2, got '+str(size))
+        self.rng = np.random.default_rng(seed)
+        self.shapes = genome_shapes(layer_sizes)
+        self.size = size
+        scales = np.concatenate([np.full(int(np.prod(s)), i_weight if l % 2 == 0 else i_bias)
+                                 for l, s in enumerate(self.shapes)])
+        n = scales.size
+        self.mean = self.rng.standard_normal(n)*scales
+        self.sigma = sigma
+        self.C = np.ones(n)
+        self.p_sigma = np.zeros(n)
+        self.p_c = np.zeros(n)
+
+        self.mu = size//2
+        weights = np.log(self.mu + 0.5) - np.log(np.arange(1, self.mu + 1))
+        self.weights = weights/weights.sum()
+        self.mueff = 1/(self.weights**2).sum()
+        self.c_sigma = (self.mueff + 2)/(n + self.mueff + 5)
+        self.d_sigma = 1 + 2*max(0, np.sqrt((self.mueff - 1)/(n + 1)) - 1) + self.c_sigma
+        self.c_c = (4 + self.mueff/n)/(n + 4 + 2*self.mueff/n)
+        # Diagonal learning rates may be (n+2)/3 times larger than full CMA's
+        c1 = 2/((n + 1.3)**2 + self.mueff)*(n + 2)/3
+        c_mu = 2*(self.mueff - 2 + 1/self.mueff)/((n + 2)**2 + self.mueff)*(n + 2)/3
+        self.c1 = min(c1, 1)
+        self.c_mu = min(c_mu, 1 - self.c1)
+        self.chi_n = np.sqrt(n)*(1 - 1/(4*n) + 1/(21*n*n))
+        self.seeds = None
+        self.generation = 0
+
+    def ask(self):
+        self.seeds = self.rng.integers(0, 2**63, self.size)
+        return Seeded_Genomes(self.mean.copy(), self.sigma*np.sqrt(self.C), self.seeds,
+                              np.ones(self.size, dtype=np.int64), self.shapes)
+
+    def tell(self, fitness):
+        n = self.mean.size
+        best = np.argsort(-np.asarray(fitness, dtype=np.float64), kind='stable')[:self.mu]
+        sqrt_c = np.sqrt(self.C)
+        z_w = np.zeros(n)
+        y2_w = np.zeros(n)
+        for w, i in zip(self.weights, best):
+            z = noise(self.seeds[i], n).astype(np.float64)
+            z_w += w*z
+            y2_w += w*(sqrt_c*z)**2
+        y_w = sqrt_c*z_w
+
+        self.mean += self.sigma*y_w
+        self.p_sigma = (1 - self.c_sigma)*self.p_sigma + \
+            np.sqrt(self.c_sigma*(2 - self.c_sigma)*self.mueff)*z_w
+        norm = np.linalg.norm(self.p_sigma)
+        self.sigma *= np.exp(self.c_sigma/self.d_sigma*(norm/self.chi_n - 1))
+        h_sigma = norm/np.sqrt(1 - (1 - self.c_sigma)**(2*(self.generation + 1))) < \
+            (1.4 + 2/(n + 1))*self.chi_n
+        self.p_c = (1 - self.c_c)*self.p_c + \
+            h_sigma*np.sqrt(self.c_c*(2 - self.c_c)*self.mueff)*y_w
+        self.C = (1 - self.c1 - self.c_mu)*self.C + \
+            self.c1*(self.p_c**2 + (1 - h_sigma)*self.c_c*(2 - self.c_c)*self.C) + \
+            self.c_mu*y2_w
+        self.generation += 1
+
+    def best_genome(self):
+        return to_genomes(self.mean.astype(DTYPE)[None], self.shapes)[0]
+
+
+STRATEGIES = {'openai-es': OpenAI_ES, 'cma-es': Sep_CMA_ES}
@@ -0,0 +1,124 @@
+import argparse
+import os
+import numpy as np
+import neuralnet as nn
+import brains
+
+RECORD_PATH = 'drives.bin'
+PRETRAINED_PATH = 'pretrained.npz'
+MAGIC = b'DRIVELOG'
+LOG_VERSION = 1
+INPUTS = 4  # speed, sfront, sleft and sright distances, what Car feeds its network
+CONTROLS = 4  # accelerate, brake, turn left, turn right as 0 or 1
+HEADER = np.dtype([('magic', 'S8'), ('version', '<u4'), ('width', '<u4')])
+FLUSH_EVERY = 4096  # Samples buffered before they are appended to the log
+CHUNK = 65536  # Samples read into memory at a time when training
+
+
+class Recorder:
+    # Appends (inputs, controls) samples as rows of little endian float32 to a binary log.
+    # A log only ever grows, several driving sessions can go into the same file
+    def __init__(self, path=RECORD_PATH):
+        self.path = path
+        new = not os.path.exists(path) or os.path.getsize(path) == 0
+        self.file = open(path, 'ab')
+        if new:
+            self.file.write(np.array((MAGIC, LOG_VERSION, INPUTS + CONTROLS), dtype=HEADER).tobytes())
+        else:
+            check_header(path)
+        self.buffer = np.empty((FLUSH_EVERY, INPUTS + CONTROLS), dtype='<f4')
+        self.count = 0
+        self.samples = 0
+
+    def record(self, inputs, controls):
+        row = self.buffer[self.count]
+        row[:INPUTS] = inputs
+        row[INPUTS:] = controls
+        self.count += 1
+        self.samples += 1
+        if self.count == FLUSH_EVERY:
+            self.flush()
+
+    def flush(self):
+        self.file.write(self.buffer[:self.count].tobytes())
+        self.file.flush()
+        self.count = 0
+
+    def close(self):
+        if not self.file.closed:
+            self.flush()
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def check_header(path):
+    header = np.fromfile(path, dtype=HEADER, count=1)
+    if header.size == 0 or header['magic'][0] != MAGIC:
+        raise ValueError(path+' is not a driving log')
+    if header['version'][0] > LOG_VERSION or header['width'][0] != INPUTS + CONTROLS:
+        raise ValueError('Driving log '+path+' has version '+str(header['version'][0]) +
+                         ' and '+str(header['width'][0])+' values per sample, expected ' +
+                         str(LOG_VERSION)+' and '+str(INPUTS + CONTROLS))
+
+
+def read(path=RECORD_PATH):
+    # Every sample as a read only (samples, INPUTS + CONTROLS) memory map, nothing is loaded up front.
+    # A partly written last row from a crash is left out
+    check_header(path)
+    samples = (os.path.getsize(path) - HEADER.itemsize) // (4*(INPUTS + CONTROLS))
+    if samples == 0:
+        return np.zeros((0, INPUTS + CONTROLS), dtype='<f4')
+    return np.memmap(path, dtype='<f4', mode='r', offset=HEADER.itemsize,
+                     shape=(samples, INPUTS + CONTROLS))
+
+
+def chunks(path=RECORD_PATH, size=CHUNK):
+    # Chunk function for nn.Batch_Loader, every epoch streams the log in pieces of size samples
+    def load():
+        records = read(path)
+        for start in range(0, len(records), size):
+            chunk = np.array(records[start:start + size])
+            yield chunk[:, :INPUTS], chunk[:, INPUTS:]
+    return load
+
+
+def train(path, hidden, epochs=20, batch_size=64, learning_rate=0.005, i_weight=0.01, i_bias=0.001, rng=None):
+    # Fits Car's network to the recorded controls. Each control is a sigmoid trained with binary
+    # cross entropy, sigmoid > 0.5 is exactly logit > 0, so Car's ReLU output layer drives the same
+    model = nn.Model()
+    model.add(nn.Layer_Dense(INPUTS, hidden, i_weight, i_bias, rng))
+    model.add(nn.Activation_ReLU())
+    model.add(nn.Layer_Dense(hidden, CONTROLS, i_weight, i_bias, rng))
+    model.add(nn.Activation_Sigmoid())
+    model.set(nn.Loss_BinaryCrossentropy(), nn.Optimizer_Adam(learning_rate))
+    history = model.train(chunks(path), epochs, batch_size, rng=rng)
+    return model, history
+
+
+def genome(model):
+    # [w1, b1, w2, b2] of the trained model, the layout Car, genCars and brains use
+    dense = [layer for layer in model.layers if isinstance(layer, nn.Layer_Dense)]
+    return [np.array(v) for layer in dense for v in (layer.weights, layer.biases)]
+
+
+if __name__ == "__main__":
+    from main import LAYER_NEURONS
+    parser = argparse.ArgumentParser(description='Train the car network on recorded drives')
+    parser.add_argument('--log', default=RECORD_PATH, help='driving log written by main.py --drive')
+    parser.add_argument('--out', default=PRETRAINED_PATH, help='brain file for main.py --pretrained')
+    parser.add_argument('--epochs', type=int, default=20)
+    parser.add_argument('--batch-size', type=int, default=64)
+    parser.add_argument('--learning-rate', type=float, default=0.005)
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+    rng = np.random.default_rng(args.seed)
+    model, history = train(args.log, LAYER_NEURONS, args.epochs, args.batch_size, args.learning_rate, rng=rng)
+    brains.save(args.out, [genome(model)], rng=brains.get_rng_state(rng),
+                hyperparameters={'source': 'imitation', 'log': args.log, 'samples': len(read(args.log)),
+                                 'epochs': args.epochs, 'accuracy': history[-1]['acc'],
+                                 'LAYER_NEURONS': LAYER_NEURONS})
@@ -1,15 +1,20 @@
 # Neural Network based self driving car learning AI
 # Version: 1.0
 # Author: Guillermo Ochoa
-# CHALLENGES:
-# -Save best Model to drive
-# -Load Model from drive
 
 import pygame as pg
 import neuralnet as nn
 import numpy as np
+import brains
+import checkpoints
+import imitation
+import replay
+import profiler
+from assets import ASSETS
 from pygame.locals import *
+import argparse
 import sys
+import time
 
 WIDTH = 1200
 HEIGHT = 900
@@ -21,42 +26,47 @@ CAR_Y = 190
 SENS_LEN = 240
 SENS_AM = 8
 
+SQRT_HALF = 0.5**0.5  # Length of the side sensor vectors
+
 GEN_SIZE = 40
 LAYER_NEURONS = 30
 WM_F = 0.005
 BM_F = 0.005
 
-class Track(pg.sprite.Sprite):
-    def __init__(self):
-        pg.sprite.Sprite.__init__(self)
-        self.image = pg.image.load('track'+str(TRACK_N)+'.png')
-        self.rect = self.image.get_rect()
-        self.mask = pg.mask.from_surface(self.image)
+TICK_RATE = 144  # Simulation ticks per second of game time
+FRAME_RATE = 60  # Frames drawn per second, ticks keep their own rate
+TOP_K = 50  # Above this many cars only the K furthest along are drawn in full, the rest as dots
+DELTA_TICKS = 2000 * TICK_RATE // 1000  # Ticks between checkpoints before force evolve
 
+SNAPSHOT_EVERY = 10  # Generations between background saves of the best brain
 
-class Checkpoints(pg.sprite.Sprite):
-    def __init__(self):
+
+DRIVE_KEYS = {K_w: 0, K_s: 1, K_a: 2, K_d: 3}  # Manual driving, index into Car.controls
+
+class Track(pg.sprite.Sprite):
+    def __init__(self, track_n=TRACK_N):
         pg.sprite.Sprite.__init__(self)
-        self.image = pg.image.load('checkpoints'+str(TRACK_N)+'.png')
+        self.image = ASSETS.image('track'+str(track_n)+'.png')
         self.rect = self.image.get_rect()
-        self.mask = pg.mask.from_surface(self.image)
+        self.mask = ASSETS.mask('track'+str(track_n)+'.png')
 
 
-class Anti_Checkpoints(pg.sprite.Sprite):
-    def __init__(self):
+class Checkpoints(pg.sprite.Sprite):
+    def __init__(self, track_n=TRACK_N):
         pg.sprite.Sprite.__init__(self)
-        self.image = pg.image.load('anti_checkpoints'+str(TRACK_N)+'.png')
+        self.image = ASSETS.image('checkpoints'+str(track_n)+'.png')
         self.rect = self.image.get_rect()
-        self.mask = pg.mask.from_surface(self.image)
+        self.mask = ASSETS.mask('checkpoints'+str(track_n)+'.png')
 
 
 class Car(pg.sprite.Sprite):
-    def __init__(self, init_x, init_y):
+    # genome [w1, b1, w2, b2] is inherited as is, without it the layers are drawn from rng
+    def __init__(self, init_x, init_y, rng=None, genome=None):
         pg.sprite.Sprite.__init__(self)
-        self.pic = pg.image.load('car.png')
+        self.pic = ASSETS.image('car.png')
         self.image = self.pic
         self.rect = self.image.get_rect(center=(init_x, init_y))
-        self.mask = pg.mask.from_surface(self.image)
+        self.mask = ASSETS.mask('car.png')
         self.x = init_x
         self.y = init_y
         # Movement
@@ -66,7 +76,10 @@ class Car(pg.sprite.Sprite):
         self.top_speed = 4.0
         self.rotation_speed = 2.0
         self.speed = 0.0
-        self.direction = pg.math.Vector2(1.0, 0.0)
+        # Angles are quantized to rotation_speed steps, images and directions come from the cache
+        self.orientations = ASSETS.orientations('car.png', self.rotation_speed)
+        self.heading = 0
+        self.direction = self.orientations.directions[0]
         self.angle = 0
         self.crashed = False
         # Sensors
@@ -76,23 +89,18 @@ class Car(pg.sprite.Sprite):
         self.sleft = pg.sprite.Group()
         self.sright = pg.sprite.Group()
 
+        sensor_size = (int(self.sensors_len/self.sensors_amount), 2)
         for f in range(self.sensors_amount):
-            self.sfront.add(Sensor(0, 0))
-            self.sfront.sprites()[f].pic = pg.transform.scale(self.sfront.sprites()[
-                f].pic, (int(self.sensors_len/self.sensors_amount), 2))
-            self.sleft.add(Sensor(0, 0))
-            self.sleft.sprites()[f].pic = pg.transform.scale(self.sleft.sprites()[
-                f].pic, (int(self.sensors_len/self.sensors_amount), 2))
-            self.sright.add(Sensor(0, 0))
-            self.sright.sprites()[f].pic = pg.transform.scale(self.sright.sprites()[
-                f].pic, (int(self.sensors_len/self.sensors_amount), 2))
+            self.sfront.add(Sensor(0, 0, sensor_size))
+            self.sleft.add(Sensor(0, 0, sensor_size))
+            self.sright.add(Sensor(0, 0, sensor_size))
 
         self.vl = pg.math.Vector2(0.5, -0.5)
         self.vr = pg.math.Vector2(0.5, 0.5)
         # Pointing System
         self.score = 0
-        self.score_colliding = False
-        self.anti_colliding = False
+        self.passed = 0
+        self.last_gate = -1
         # Inputs
         self.sfront_distance = self.sensors_len + self.sensors_len/self.sensors_amount
         self.sleft_distance = self.sensors_len + self.sensors_len/self.sensors_amount
@@ -103,28 +111,50 @@ class Car(pg.sprite.Sprite):
         self.turn_right = 0
         self.accelerate = False
         self.brake = False
+        # [accelerate, brake, turn left, turn right] set by hand, None lets the network drive
+        self.controls = None
         # Neural Net Initializers
         i_weight = 0.01
         i_bias = 0.001
-        self.dense1 = nn.Layer_Dense(4, LAYER_NEURONS, i_weight, i_bias)
+        if genome is None:
+            self.dense1 = nn.Layer_Dense(4, LAYER_NEURONS, i_weight, i_bias, rng)
+            self.dense2 = nn.Layer_Dense(LAYER_NEURONS, 4, i_weight, i_bias, rng)
+        else:
+            self.dense1 = nn.Layer_Dense.inherited(genome[0], genome[1])
+            self.dense2 = nn.Layer_Dense.inherited(genome[2], genome[3])
         self.activation1 = nn.Activation_ReLU()
-        self.dense2 = nn.Layer_Dense(LAYER_NEURONS, 4, i_weight, i_bias)
         self.activation2 = nn.Activation_ReLU()
+        # Driving only needs forward, done without allocating
+        self.brain = nn.Inference_Network([self.dense1, self.dense2])
+
+    def orient(self, heading):
+        # Points the car at heading, in rotation_speed steps, the rect is centered by update
+        self.heading = heading
+        self.angle = self.heading*self.rotation_speed
+        self.direction = self.orientations.directions[self.heading]
+        self.vl = self.direction.rotate(-45)*SQRT_HALF
+        self.vr = self.direction.rotate(45)*SQRT_HALF
+        self.image = self.orientations.images[self.heading]
+        self.mask = self.orientations.masks[self.heading]
+        self.rect = self.image.get_rect()
 
-    def update(self):
+    def update(self, sensing=True):
         if not self.crashed:
-            # Neural Net
-            n_input = np.array(
-                [self.speed, self.sfront_distance, self.sleft_distance, self.sright_distance], dtype=np.float32)
-            self.dense1.forward(n_input)
-            self.activation1.forward(self.dense1.output)
-            self.dense2.forward(self.activation1.output)
-            self.activation2.forward(self.dense2.output)
+            if self.controls is None:
+                # Neural Net
+                n_input = self.brain.inputs[0]
+                n_input[0] = self.speed
+                n_input[1] = self.sfront_distance
+                n_input[2] = self.sleft_distance
+                n_input[3] = self.sright_distance
+                output = self.brain.forward()[0]
+            else:
+                output = self.controls
             # Outputs
-            self.accelerate = self.activation2.output[0][0]
-            self.brake = self.activation2.output[0][1]
-            self.turn_left = self.activation2.output[0][2]
-            self.turn_right = self.activation2.output[0][3]
+            self.accelerate = output[0]
+            self.brake = output[1]
+            self.turn_left = output[2]
+            self.turn_right = output[3]
             if self.turn_left:
                 self.turn = -1
             if self.turn_right:
@@ -134,20 +164,7 @@ class Car(pg.sprite.Sprite):
 
             # Car Mechanics
             if (self.turn != 0):
-                self.angle -= self.turn*self.rotation_speed
-                if(self.angle > 360):
-                    self.angle = 0
-                if(self.angle < 0):
-                    self.angle = 360
-
-                self.direction.rotate_ip(self.turn*self.rotation_speed)
-                self.vl.rotate_ip(self.turn*self.rotation_speed)
-                self.vr.rotate_ip(self.turn*self.rotation_speed)
-                self.image, self.rect = self.rotate(self.pic, self.angle)
-                self.mask = pg.mask.from_surface(self.image)
-
-                if self.angle == 0:
-                    self.angle_reset()
+                self.orient((self.heading - self.turn) % self.orientations.count)
 
             if(self.accelerate and self.speed < self.top_speed):
                 self.speed += self.acceleration
@@ -162,6 +179,9 @@ class Car(pg.sprite.Sprite):
             self.y += (self.direction * self.speed)[1]
             self.rect.center = int(self.x), int(self.y)
 
+            # Sensor sprites only matter when Simulation.sense reads them
+            if not sensing:
+                return
             for s in range(self.sensors_amount):
                 self.sfront.sprites()[s].update(
                     self.x + (self.direction*self.sensors_len *
@@ -184,338 +204,660 @@ class Car(pg.sprite.Sprite):
                               (s+1)/(self.sensors_amount))[1],
                     self.angle-45)
 
-    def rotate(self, image, angle):
-        rot_image = pg.transform.rotate(image, angle)
-        rot_rect = rot_image.get_rect(center=self.rect.center)
-        return rot_image, rot_rect
-
-    def angle_reset(self):
-        # Fix for visual glitches after multiple rotations
-        self.image = self.pic
-        self.rect = self.image.get_rect(center=self.rect.center)
-        self.direction = pg.math.Vector2(1.0, 0.0)
-        self.vl = pg.math.Vector2(0.5, -0.5)
-        self.vr = pg.math.Vector2(0.5, 0.5)
-        for s in range(self.sensors_amount):
-            self.sfront.sprites()[s].image = self.sfront.sprites()[s].pic
-            self.sfront.sprites()[s].rect = self.sfront.sprites()[
-                s].image.get_rect()
-            self.sleft.sprites()[s].image = self.sleft.sprites()[s].pic
-            self.sleft.sprites()[s].rect = self.sleft.sprites()[
-                s].image.get_rect()
-            self.sright.sprites()[s].image = self.sright.sprites()[s].pic
-            self.sright.sprites()[s].rect = self.sright.sprites()[
-                s].image.get_rect()
-
 
 class Sensor(pg.sprite.Sprite):
-    def __init__(self, init_x, init_y):
+    def __init__(self, init_x, init_y, size=None):
         pg.sprite.Sprite.__init__(self)
-        self.pic = pg.image.load('sensor.png')
+        self.size = size
+        self.pic = ASSETS.image('sensor.png', size, (255, 0, 0))
         self.image = self.pic
         self.rect = self.image.get_rect(center=(init_x, init_y))
-        self.mask = pg.mask.from_surface(self.image)
+        self.mask = ASSETS.mask('sensor.png', size)
         self.detection = True
 
     def update(self, xpos, ypos, angle):
-        self.image, self.rect = self.rotate(self.pic, angle)
-        self.rect.center = int(xpos), int(ypos)
-        self.mask = pg.mask.from_surface(self.image)
+        # Sensors sit at 45 degrees from the car, so their cache has 1 degree steps
         if (self.detection):
-            self.pic.fill((255, 0, 0))
+            orientations = ASSETS.orientations('sensor.png', 1, self.size, (255, 0, 0))
         else:
-            self.pic.fill((0, 255, 0))
-
-    def rotate(self, image, angle):
-        rot_image = pg.transform.rotate(image, angle)
-        rot_rect = rot_image.get_rect(center=self.rect.center)
-        return rot_image, rot_rect
+            orientations = ASSETS.orientations('sensor.png', 1, self.size, (0, 255, 0))
+        self.image, self.mask, offset = orientations.lookup(angle)
+        self.rect = self.image.get_rect(topleft=(int(xpos) + offset[0], int(ypos) + offset[1]))
 
 
-def genCars(cars_group, w1=np.arange(3, LAYER_NEURONS), b1=np.arange(1, LAYER_NEURONS), w2=np.arange(3, LAYER_NEURONS), b2=np.arange(1, LAYER_NEURONS), evolve=False):
+def genCars(cars_group, w1=None, b1=None, w2=None, b2=None, evolve=False, rng=None, pretrained=None, size=GEN_SIZE):
     if evolve:
         # Evolve after all cars crash or E is pressed, best car is cloned once, rest of cars are mutated from best car
-        for i in range(GEN_SIZE):
-            c = Car(CAR_X, CAR_Y)
-            c.dense1.inherit_and_evolve_WB(w1, b1, wmf=WM_F*i, bmf=BM_F*i)
-            c.dense2.inherit_and_evolve_WB(w2, b2, wmf=WM_F*i, bmf=BM_F*i)
-            cars_group.add(c)
+        # Car i gets noise scaled by i, every child is drawn in one batch
+        factors = np.arange(size)
+        children = nn.mutate_genome([w1, b1, w2, b2], size, rng,
+                                    wmf=WM_F*factors, bmf=BM_F*factors)
+        for i in range(size):
+            cars_group.add(Car(CAR_X, CAR_Y, genome=[child[i] for child in children]))
+    elif pretrained:
+        # Fresh start from pretrained genomes, each is kept once and the rest of the cars
+        # are mutated from them in turn, noise growing like in evolve
+        for k, genome in enumerate(pretrained):
+            members = np.arange(k, size, len(pretrained))
+            factors = members // len(pretrained)
+            children = nn.mutate_genome(genome, members.size, rng,
+                                        wmf=WM_F*factors, bmf=BM_F*factors)
+            for j in range(members.size):
+                cars_group.add(Car(CAR_X, CAR_Y, genome=[child[j] for child in children]))
     else:
         # Fresh Start Cars
-        for i in range(GEN_SIZE):
-            cars_group.add(Car(CAR_X, CAR_Y))
-
-
-def main():
-    pg.init()
-    screen = pg.display.set_mode((WIDTH, HEIGHT))
-    pg.display.set_caption("Handmade Brain")
-    clock = pg.time.Clock()
-    check_time = pg.time.get_ticks()
-
-    # Content Setup
-    track = Track()
-    checkpoints = Checkpoints()
-    anti_checkpoints = Anti_Checkpoints()
-    draw_checkpoints = False
-    pressing_c = False
-    draw_sensors = True
-    pressing_s = False
-
-    # Score Setup
-    font = pg.font.Font(pg.font.get_default_font(), 20)
-    highest_score = 0
-    top = Car(0,0)
-    original = Car(0,0)
-
-    # Cars
-    cars_crashed = 0
-    cars = pg.sprite.Group()
-    genCars(cars)
-
-    # Evolution
-    delta_time = 2000  # Time between checkpoints before force evolve
-    generation = 1
-    hs_w1 = np.arange(4, LAYER_NEURONS)
-    hs_b1 = np.arange(1, LAYER_NEURONS)
-    hs_w2 = np.arange(LAYER_NEURONS, 4)
-    hs_b2 = np.arange(1, LAYER_NEURONS)
-
+        for i in range(size):
+            cars_group.add(Car(CAR_X, CAR_Y, rng))
+
+
+class Simulation:
+    # Headless engine: steps game rules, cars and evolution by ticks, needs no display.
+    # Every random draw comes from self.rng, so a seed makes a run reproducible
+    def __init__(self, seed=None, pretrained=None, track_n=TRACK_N, size=GEN_SIZE):
+        self.rng = np.random.default_rng(seed)
+        self.track_n = track_n
+        self.size = size
+        # Genomes the first generation starts from, e.g. trained by imitation.py
+        self.pretrained = pretrained
+        self.track = Track(track_n)
+        self.checkpoints = Checkpoints(track_n)
+        self.gates = checkpoints.Gate_Index.from_track(track_n, (CAR_X, CAR_Y))
+        self.cars = pg.sprite.Group()
+        self.observers = []
+        self.top = None
+        self.original = None
+        self.best_scores = []
+        self.snapshotter = None
+        self.player = None
+        self.recorder = None
+        # Called before the cars move each tick, replay.Replay_Player sets their controls
+        self.driver = None
+        self.replay = None
+        self.sensing = True
+        self.step_start = None
+        self.profile(profiler.OFF)
+        self.controls = np.zeros(4, dtype=np.float32)
+        self.restart(generation=1)
+
+    def attach(self, observer):
+        # Observers are called with the simulation after every tick
+        self.observers.append(observer)
+
+    def restart(self, generation=0):
+        self.cars.empty()
+        self.tick = 0
+        self.check_tick = 0
+        self.highest_score = 0
+        self.cars_crashed = 0
+        self.generation = generation
+        self.hs_w1 = None
+        self.hs_b1 = None
+        self.hs_w2 = None
+        self.hs_b2 = None
+        genCars(self.cars, rng=self.rng, pretrained=self.pretrained, size=self.size)
+        self.population = self.cars.sprites()
+        self.original = self.population[0]
+
+    def fitness(self):
+        # Arc length driven by every car of this generation, crashed cars included
+        return self.gates.progress(np.array([i.passed for i in self.population]),
+                                   np.array([i.x for i in self.population]),
+                                   np.array([i.y for i in self.population]))
+
+    def evolve(self):
+        # Selection on the dense fitness, ties go to the earliest car which is the previous best's clone
+        best = self.population[int(np.argmax(self.fitness()))]
+        self.hs_w1 = best.dense1.weights
+        self.hs_b1 = best.dense1.biases
+        self.hs_w2 = best.dense2.weights
+        self.hs_b2 = best.dense2.biases
+        self.best_scores.append(self.highest_score)
+        if self.snapshotter is not None and self.generation % SNAPSHOT_EVERY == 0:
+            self.snapshotter.submit([self.best_genome()], generation=self.generation,
+                                    rng=brains.get_rng_state(self.rng), hyperparameters=self.hyperparameters())
+        self.spawn()
+
+    def spawn(self):
+        # Next generation from the saved best car
+        self.cars.empty()
+        self.highest_score = 0
+        self.cars_crashed = 0
+        self.generation += 1
+        genCars(self.cars, w1=self.hs_w1, b1=self.hs_b1,
+                w2=self.hs_w2, b2=self.hs_b2, evolve=True, rng=self.rng, size=self.size)
+        self.population = self.cars.sprites()
+        self.original = self.population[0]
+
+    def best_genome(self):
+        return [self.hs_w1, self.hs_b1, self.hs_w2, self.hs_b2]
+
+    def hyperparameters(self):
+        return {'TRACK_N': self.track_n, 'GEN_SIZE': self.size, 'LAYER_NEURONS': LAYER_NEURONS,
+                'WM_F': WM_F, 'BM_F': BM_F, 'SENS_LEN': SENS_LEN, 'SENS_AM': SENS_AM}
+
+    def save_brain(self, path=brains.BRAIN_PATH):
+        # Nothing to save before the first evolution
+        if self.hs_w1 is not None:
+            brains.save(path, [self.best_genome()], generation=self.generation,
+                        rng=brains.get_rng_state(self.rng), hyperparameters=self.hyperparameters())
+
+    def load_brain(self, path=brains.BRAIN_PATH):
+        # Continues evolution from the fittest genome in the file
+        params, meta = brains.load(path)
+        genomes = brains.genomes(params)
+        best = int(np.argmax(meta['fitness'])) if 'fitness' in meta else 0
+        self.hs_w1, self.hs_b1, self.hs_w2, self.hs_b2 = genomes[best]
+        brains.set_rng_state(meta['rng'], self.rng)
+        self.generation = meta['generation']
+        self.spawn()
+
+    def drive(self, recorder=None):
+        # One car driven with W/A/S/D instead of a generation, respawned when it crashes.
+        # With a recorder every tick's network inputs and keys are logged for imitation.py
+        self.recorder = recorder
+        self.cars.empty()
+        self.highest_score = 0
+        self.cars_crashed = 0
+        self.player = Car(CAR_X, CAR_Y, self.rng)
+        self.player.controls = self.controls
+        self.cars.add(self.player)
+        self.population = [self.player]
+        self.original = self.player
+
+    def profile(self, profiler):
+        # Phase timings and counters go to profiler, profiler.OFF costs next to nothing
+        self.profiler = profiler
+        self.collide_mask = profiler.counted('collide_mask', pg.sprite.collide_mask)
+
+    def close(self):
+        self.profiler.close()
+        self.save_brain()
+        if self.recorder is not None:
+            self.recorder.close()
+        if self.replay is not None:
+            self.replay.close()
+
+    def snapshot(self, path=brains.ARCHIVE_PATH):
+        # Saves the best brain every SNAPSHOT_EVERY generations without stalling step()
+        self.snapshotter = brains.Snapshotter(path)
+
+    def crash(self, car):
+        car.crashed = True
+        car.accelerate = False
+        car.turn = False
+        car.brake = False
+        self.cars_crashed += 1
+
+    def sense(self, car):
+        # Sensor distances of one car from collide_mask tests of its sensor sprites
+        for s in range(car.sensors_amount):
+            if self.collide_mask(car.sfront.sprites()[s], self.track):
+                if (s-1 < 0):
+                    car.sfront_distance = (
+                        car.sensors_len/car.sensors_amount)*(s+1)
+                    car.sfront.sprites()[s].detection = True
+                elif not car.sfront.sprites()[s-1].detection:
+                    car.sfront_distance = (
+                        car.sensors_len/car.sensors_amount)*(s+1)
+                    car.sfront.sprites()[s].detection = True
+            elif (s-1 >= 0):
+                if car.sfront.sprites()[s-1].detection:
+                    car.sfront.sprites()[s].detection = True
+                if not car.sfront.sprites()[s-1].detection:
+                    car.sfront.sprites()[s].detection = False
+            elif (s-1 < 0):
+                car.sfront.sprites()[s].detection = False
+            if (s == car.sensors_amount - 1) and not car.sfront.sprites()[s].detection:
+                car.sfront_distance = car.sensors_len + car.sensors_len/car.sensors_amount
+
+            if self.collide_mask(car.sright.sprites()[s], self.track):
+                if (s-1 < 0):
+                    car.sright_distance = (
+                        car.sensors_len/car.sensors_amount)*(s+1)
+                    car.sright.sprites()[s].detection = True
+                elif not car.sright.sprites()[s-1].detection:
+                    car.sright_distance = (
+                        car.sensors_len/car.sensors_amount)*(s+1)
+                    car.sright.sprites()[s].detection = True
+            elif (s-1 >= 0):
+                if car.sright.sprites()[s-1].detection:
+                    car.sright.sprites()[s].detection = True
+                if not car.sright.sprites()[s-1].detection:
+                    car.sright.sprites()[s].detection = False
+            elif (s-1 < 0):
+                car.sright.sprites()[s].detection = False
+            if (s == car.sensors_amount - 1) and not car.sright.sprites()[s].detection:
+                car.sright_distance = car.sensors_len + car.sensors_len/car.sensors_amount
+
+            if self.collide_mask(car.sleft.sprites()[s], self.track):
+                if (s-1 < 0):
+                    car.sleft_distance = (
+                        car.sensors_len/car.sensors_amount)*(s+1)
+                    car.sleft.sprites()[s].detection = True
+                elif not car.sleft.sprites()[s-1].detection:
+                    car.sleft_distance = (
+                        car.sensors_len/car.sensors_amount)*(s+1)
+                    car.sleft.sprites()[s].detection = True
+            elif (s-1 >= 0):
+                if car.sleft.sprites()[s-1].detection:
+                    car.sleft.sprites()[s].detection = True
+                if not car.sleft.sprites()[s-1].detection:
+                    car.sleft.sprites()[s].detection = False
+            elif (s-1 < 0):
+                car.sleft.sprites()[s].detection = False
+            if (s == car.sensors_amount - 1) and not car.sleft.sprites()[s].detection:
+                car.sleft_distance = car.sensors_len + car.sensors_len/car.sensors_amount
+
+    def step(self):
+        profiler = self.profiler
+        # What this tick started from, replay.Replay_Recorder tells restarts between ticks from evolutions
+        self.step_start = (self.population, self.tick, self.check_tick, self.generation)
+        # Game Events
+        with profiler.phase('rules'):
+            # Per car collide_mask, collision.Collision_Kernel only pays off when the poses are
+            # already arrays like in engine.Engine, gathering them from sprites costs more than it saves
+            for i in self.cars:
+                if not i.crashed:
+                    if i.score <= self.highest_score-40:
+                        # Crash car if not scoring
+                        self.crash(i)
+                    if self.collide_mask(i, self.track):
+                        # Crash with Track
+                        self.crash(i)
+
+                    gate = int(self.gates.lookup(i.x, i.y))
+                    if gate >= 0 and gate == i.passed % self.gates.count:
+                        # Score on the next checkpoint in order
+                        self.check_tick = self.tick
+                        i.score += 10
+                        i.passed += 1
+                        i.last_gate = gate
+                    elif gate >= 0 and gate != i.last_gate:
+                        # Checkpoint out of order, car is going wrong way
+                        self.crash(i)
+                    # Gets highest score
+                    if i.score > self.highest_score:
+                        self.top = i
+                        self.highest_score = i.score
+
+                    if i.crashed:
+                        self.cars.remove(i)
+
+        # Check for Sensors, only the networks and the overlay read them
+        if self.sensing:
+            with profiler.phase('sensors'):
+                for i in self.cars:
+                    self.sense(i)
+
+        with profiler.phase('evolve'):
+            if self.player is not None:
+                if self.player.crashed:
+                    self.drive(self.recorder)
+                elif self.recorder is not None:
+                    p = self.player
+                    self.recorder.record((p.speed, p.sfront_distance, p.sleft_distance, p.sright_distance),
+                                         self.controls)
+            else:
+                if self.cars_crashed == self.size:
+                    # Evolve after all cars crash
+                    self.evolve()
+
+                if self.check_tick <= self.tick-DELTA_TICKS:
+                    # Evolve after too many ticks passed between checkpoints
+                    self.check_tick = self.tick
+                    self.evolve()
+
+        with profiler.phase('update'):
+            if self.driver is not None:
+                self.driver(self)
+            self.cars.update(self.sensing)
+        self.tick += 1
+
+        with profiler.phase('observers'):
+            for observer in self.observers:
+                observer(self)
+        profiler.end_tick(self.tick)
+
+
+class Sim_Clock:
+    # Fixed timestep, game time moves in 1/tick_rate steps however long frames take.
+    # due() is how many ticks the real time since the last call is worth, ticks() runs them
+    # for one frame but stops after budget seconds of real time. When ticks are slower than
+    # real time the lag left then is dropped, the game slows down but frames and input keep coming
+    def __init__(self, tick_rate=TICK_RATE, budget=1/FRAME_RATE):
+        self.dt = 1/tick_rate
+        self.budget = budget
+        self.last = time.perf_counter()
+        self.lag = 0.0
+
+    def due(self):
+        now = time.perf_counter()
+        self.lag += now - self.last
+        self.last = now
+        steps = int(self.lag/self.dt)
+        self.lag -= steps*self.dt
+        return steps
+
+    def ticks(self):
+        start = time.perf_counter()
+        for _ in range(self.due()):
+            yield
+            if time.perf_counter() - start >= self.budget:
+                self.lag = 0.0
+                return
+
+
+def run(sim, renderer):
+    # Ticks follow the fixed clock, frames are drawn between them
+    # Uncapped frames (fps 0) still get the default budget
+    clock = Sim_Clock(budget=1/(renderer.fps or FRAME_RATE))
     while 1:
-        # Input Events
+        for _ in clock.ticks():
+            sim.step()
+        renderer(sim)
+
+
+class Renderer:
+    # Optional observer that draws the simulation and handles keyboard input
+    def __init__(self, fps=FRAME_RATE, top_k=TOP_K):
+        pg.init()
+        self.screen = pg.display.set_mode((WIDTH, HEIGHT))
+        pg.display.set_caption("Handmade Brain")
+        self.clock = pg.time.Clock()
+        self.fps = fps
+        self.font = pg.font.Font(pg.font.get_default_font(), 20)
+        self.draw_checkpoints = False
+        self.pressing_c = False
+        self.draw_sensors = True
+        self.pressing_s = False
+        self.draw_profile = False
+        self.own_profiler = False
+        self.small_font = pg.font.Font(pg.font.get_default_font(), 13)
+        self.top_k = top_k
+        self.texts = {}
+        self.background_key = None
+        self.background_surface = None
+
+    def __call__(self, sim):
+        with sim.profiler.phase('events'):
+            self.handle_events(sim)
+        with sim.profiler.phase('draw'):
+            self.draw(sim)
+            pg.display.flip()
+        # fps 0 runs uncapped
+        self.clock.tick(self.fps)
+
+    def handle_events(self, sim):
         for event in pg.event.get():
             # Input Events
-            # for i in cars:
-                # if event.type == KEYDOWN:
-                #     if event.key == K_w:
-                #         i.accelerate = True
-                #     if event.key == K_a:
-                #         i.turn = -1
-                #     if event.key == K_d:
-                #         i.turn = 1
-                #     if event.key == K_s:
-                #         i.brake = True
-                # if event.type == KEYUP:
-                #     if event.key == K_w:
-                #         i.accelerate = False
-                #     if event.key == K_a:
-                #         i.turn = 0
-                #     if event.key == K_d:
-                #         i.turn = 0
-                #     if event.key == K_s:
-                #         i.brake = False
+            if sim.player is not None and event.type in (KEYDOWN, KEYUP) and event.key in DRIVE_KEYS:
+                # Manual driving, W accelerates, S brakes, A and D turn
+                sim.controls[DRIVE_KEYS[event.key]] = event.type == KEYDOWN
+                continue
             if event.type == QUIT or (event.type == KEYDOWN and event.key == K_ESCAPE):
+                sim.close()
                 pg.quit()
                 sys.exit()
             if event.type == KEYDOWN:
                 if event.key == K_r:
-                    # Restarts Evolution
-                    cars.empty()
-                    highest_score = 0
-                    cars_crashed = 0
-                    generation = 0
-                    hs_w1 = np.zeros_like(hs_w1)
-                    hs_b1 = np.zeros_like(hs_b1)
-                    hs_w2 = np.zeros_like(hs_w2)
-                    hs_b2 = np.zeros_like(hs_b2)
-                    genCars(cars)
-                    original = cars.sprites()[0]
+                    # Restarts Evolution, best brain so far is kept on drive
+                    sim.save_brain()
+                    sim.restart()
+                if event.key == K_b:
+                    # Save best Model to drive
+                    sim.save_brain()
+                if event.key == K_l:
+                    # Load Model from drive
+                    sim.load_brain()
                 if event.key == K_e:
                     # Force Evolve
-                    cars.empty()
-                    highest_score = 0
-                    cars_crashed = 0
-                    generation += 1
-                    genCars(cars, w1=hs_w1, b1=hs_b1,
-                            w2=hs_w2, b2=hs_b2, evolve=True)
-                    original = cars.sprites()[0]
-                if event.key == K_c and not pressing_c:
-                    if draw_checkpoints:
-                        draw_checkpoints = False
+                    sim.evolve()
+                if event.key == K_c and not self.pressing_c:
+                    if self.draw_checkpoints:
+                        self.draw_checkpoints = False
                     else:
-                        draw_checkpoints = True
-                    pressing_c = True
-                if event.key == K_s and not pressing_s:
-                    if draw_sensors:
-                        draw_sensors = False
+                        self.draw_checkpoints = True
+                    self.pressing_c = True
+                if event.key == K_p:
+                    self.toggle_profile(sim)
+                if event.key == K_s and not self.pressing_s:
+                    if self.draw_sensors:
+                        self.draw_sensors = False
                     else:
-                        draw_sensors = True
-                    pressing_s = True
+                        self.draw_sensors = True
+                    self.pressing_s = True
             if event.type == KEYUP:
                 if event.key == K_c:
-                    pressing_c = False
+                    self.pressing_c = False
                 if event.key == K_s:
-                    pressing_s = False
-
-        # Game Events
-        for i in cars:
-            if not i.crashed:
-                if i.score <= highest_score-40:
-                    # Crash car if not scoring
-                    i.crashed = True
-                    i.accelerate = False
-                    i.turn = False
-                    i.brake = False
-                    cars_crashed += 1
-                if pg.sprite.collide_mask(i, track):
-                    # Crash with Track
-                    i.crashed = True
-                    i.accelerate = False
-                    i.turn = False
-                    i.brake = False
-                    cars_crashed += 1
-
-                if pg.sprite.collide_mask(i, checkpoints):
-                    # Score on checkpoint and lock
-                    if not i.score_colliding and not i.anti_colliding:
-                        check_time = pg.time.get_ticks()
-                        i.score += 10
-                        i.score_colliding = True
-                if pg.sprite.collide_mask(i, anti_checkpoints):
-                    # Checks if car is going wrong way
-                    if not i.score_colliding:
-                        i.crashed = True
-                        i.accelerate = False
-                        i.turn = False
-                        i.brake = False
-                        cars_crashed += 1
-                    else:
-                        i.anti_colliding = True
-                if not pg.sprite.collide_mask(i, anti_checkpoints) and not pg.sprite.collide_mask(i, checkpoints) and i.anti_colliding:
-                    # Checkpoint Unlock
-                    i.anti_colliding = False
-                    i.score_colliding = False
-                # Gets highest score and saves car's data
-                if i.score > highest_score:
-                    try:
-                        output = i.activation2.output
-                    except:
-                        pass
-                    top = i
-                    highest_score = i.score
-                    hs_w1 = i.dense1.weights
-                    hs_b1 = i.dense1.biases
-                    hs_w2 = i.dense2.weights
-                    hs_b2 = i.dense2.biases
-
-                # Check for Sensors
-                for s in range(i.sensors_amount):
-                    if pg.sprite.collide_mask(i.sfront.sprites()[s], track):
-                        if (s-1 < 0):
-                            i.sfront_distance = (
-                                i.sensors_len/i.sensors_amount)*(s+1)
-                            i.sfront.sprites()[s].detection = True
-                        elif not i.sfront.sprites()[s-1].detection:
-                            i.sfront_distance = (
-                                i.sensors_len/i.sensors_amount)*(s+1)
-                            i.sfront.sprites()[s].detection = True
-                    elif (s-1 >= 0):
-                        if i.sfront.sprites()[s-1].detection:
-                            i.sfront.sprites()[s].detection = True
-                        if not i.sfront.sprites()[s-1].detection:
-                            i.sfront.sprites()[s].detection = False
-                    elif (s-1 < 0):
-                        i.sfront.sprites()[s].detection = False
-                    if (s == i.sensors_amount - 1) and not i.sfront.sprites()[s].detection:
-                        i.sfront_distance = i.sensors_len + i.sensors_len/i.sensors_amount
-
-                    if pg.sprite.collide_mask(i.sright.sprites()[s], track):
-                        if (s-1 < 0):
-                            i.sright_distance = (
-                                i.sensors_len/i.sensors_amount)*(s+1)
-                            i.sright.sprites()[s].detection = True
-                        elif not i.sright.sprites()[s-1].detection:
-                            i.sright_distance = (
-                                i.sensors_len/i.sensors_amount)*(s+1)
-                            i.sright.sprites()[s].detection = True
-                    elif (s-1 >= 0):
-                        if i.sright.sprites()[s-1].detection:
-                            i.sright.sprites()[s].detection = True
-                        if not i.sright.sprites()[s-1].detection:
-                            i.sright.sprites()[s].detection = False
-                    elif (s-1 < 0):
-                        i.sright.sprites()[s].detection = False
-                    if (s == i.sensors_amount - 1) and not i.sright.sprites()[s].detection:
-                        i.sright_distance = i.sensors_len + i.sensors_len/i.sensors_amount
-
-                    if pg.sprite.collide_mask(i.sleft.sprites()[s], track):
-                        if (s-1 < 0):
-                            i.sleft_distance = (
-                                i.sensors_len/i.sensors_amount)*(s+1)
-                            i.sleft.sprites()[s].detection = True
-                        elif not i.sleft.sprites()[s-1].detection:
-                            i.sleft_distance = (
-                                i.sensors_len/i.sensors_amount)*(s+1)
-                            i.sleft.sprites()[s].detection = True
-                    elif (s-1 >= 0):
-                        if i.sleft.sprites()[s-1].detection:
-                            i.sleft.sprites()[s].detection = True
-                        if not i.sleft.sprites()[s-1].detection:
-                            i.sleft.sprites()[s].detection = False
-                    elif (s-1 < 0):
-                        i.sleft.sprites()[s].detection = False
-                    if (s == i.sensors_amount - 1) and not i.sleft.sprites()[s].detection:
-                        i.sleft_distance = i.sensors_len + i.sensors_len/i.sensors_amount
-                
-                if i.crashed:
-                    cars.remove(i)
-
-        if cars_crashed == GEN_SIZE:
-            # Evolve after all cars crash
-            cars.empty()
-            highest_score = 0
-            cars_crashed = 0
-            generation += 1
-            genCars(cars, w1=hs_w1, b1=hs_b1, w2=hs_w2, b2=hs_b2, evolve=True)
-            original = cars.sprites()[0]
-
-        if check_time <= pg.time.get_ticks()-delta_time:
-            # Evolve after too much time passed between checkpoints
-            check_time = pg.time.get_ticks()
-            cars.empty()
-            highest_score = 0
-            cars_crashed = 0
-            generation += 1
-            genCars(cars, w1=hs_w1, b1=hs_b1, w2=hs_w2, b2=hs_b2, evolve=True)
-            original = cars.sprites()[0]
-
-        # Drawing
-        screen.fill((100, 100, 100))
-        if draw_checkpoints:
-            screen.blit(checkpoints.image, (0, 0))
-            screen.blit(anti_checkpoints.image, (0, 0))
-        screen.blit(track.image, (0, 0))
-        cars.update()
-        cars.draw(screen)
-        if draw_sensors:
-            for i in cars:
-                if not i.crashed:
-                    for s in range(i.sensors_amount):
-                        screen.blit(i.sfront.sprites()[
-                                    s].image, i.sfront.sprites()[s].rect.topleft)
-                        screen.blit(i.sleft.sprites()[
-                                    s].image, i.sleft.sprites()[s].rect.topleft)
-                        screen.blit(i.sright.sprites()[
-                                    s].image, i.sright.sprites()[s].rect.topleft)
-
-        screen.blit(pg.font.Font.render(font, "Highest Score: " +
-                                        str(highest_score), True, (255, 255, 255)), (5, 10))
-        screen.blit(pg.font.Font.render(font, "Crashed: " +
-                                        str(cars_crashed) + "/" + str(GEN_SIZE), True, (255, 255, 255)), (250, 10))
-        screen.blit(pg.font.Font.render(font, "Generation: " +
-                                        str(generation), True, (255, 255, 255)), (420, 10))
-        screen.blit(pg.font.Font.render(font, "Time between checkpoints: " +
-                                        str((pg.time.get_ticks() - check_time)/1000), True, (255, 255, 255)), (600, 10))
-
-        if top in cars:
-            screen.blit(pg.font.Font.render(font, "1", True, (255, 255, 255)), top.rect.topleft)
-        if original in cars:
-            screen.blit(pg.font.Font.render(font, "og", True, (255, 255, 255)), original.rect.topright)
-
-        pg.display.flip()
-
-        clock.tick(144)
+                    self.pressing_s = False
+
+    def toggle_profile(self, sim):
+        # Shows the profiler overlay, profiling only while it is shown unless a sink was asked for
+        self.draw_profile = not self.draw_profile
+        if self.draw_profile and not sim.profiler.enabled:
+            sim.profile(profiler.Profiler())
+            self.own_profiler = True
+        elif not self.draw_profile and self.own_profiler:
+            sim.profiler.close()
+            sim.profile(profiler.OFF)
+            self.own_profiler = False
+
+    def draw_profiler(self, sim):
+        phases, counts = sim.profiler.stats()
+        if not phases:
+            return
+        x, y = WIDTH - 330, 40
+        lines = ['phase       mean    p95    max ms']
+        lines += [f'{name:<9}{mean:7.2f}{p95:7.2f}{peak:7.2f}' for name, (mean, p95, peak) in phases.items()]
+        lines += [f'{name}: {value:.1f}/tick' for name, value in counts.items()]
+        panel = pg.Surface((320, 18*len(lines) + 70), pg.SRCALPHA)
+        panel.fill((0, 0, 0, 160))
+        self.screen.blit(panel, (x - 5, y - 5))
+        for k, line in enumerate(lines):
+            self.screen.blit(self.text(('profile', k), line, self.small_font), (x, y + 18*k))
+        # Rolling histogram of whole tick times
+        hist, edges = sim.profiler.histogram()
+        top = y + 18*len(lines) + 55
+        width = 300 // len(hist)
+        for k, n in enumerate(hist):
+            height = int(50*n/max(hist.max(), 1))
+            pg.draw.rect(self.screen, (120, 200, 255), (x + k*width, top - height, width - 1, height))
+        self.screen.blit(self.small_font.render(f'{edges[0]:.1f} - {edges[-1]:.1f} ms per tick', True,
+                                                (255, 255, 255)), (x, top + 2))
+
+    def text(self, key, string, font=None):
+        # Text surfaces are rendered again only when their string changes
+        cached = self.texts.get(key)
+        if cached is None or cached[0] != string:
+            cached = (string, (font or self.font).render(string, True, (255, 255, 255)))
+            self.texts[key] = cached
+        return cached[1]
+
+    def split(self, sim):
+        # (cars drawn in full, cars drawn as dots), the top_k furthest along the track get the detail.
+        # Crashed cars never take one of those slots
+        cars = sim.cars.sprites()
+        if len(cars) <= self.top_k:
+            return cars, []
+        alive = [c for c in cars if not c.crashed]
+        crashed = [c for c in cars if c.crashed]
+        if len(alive) <= self.top_k:
+            return alive, crashed
+        progress = sim.gates.progress(np.array([c.passed for c in alive]),
+                                      np.array([c.x for c in alive]), np.array([c.y for c in alive]))
+        detailed = np.zeros(len(alive), dtype=bool)
+        detailed[np.argpartition(-progress, self.top_k)[:self.top_k]] = True
+        return ([c for c, d in zip(alive, detailed) if d],
+                [c for c, d in zip(alive, detailed) if not d] + crashed)
+
+    def draw_rays(self, cars):
+        # Each sensor is at most two lines instead of a blit per segment,
+        # green up to the first segment touching the track and red from there on
+        screen = self.screen
+        for car in cars:
+            # Crashed cars keep their last readings, they were never drawn
+            if car.crashed:
+                continue
+            n = car.sensors_amount
+            for group, v in ((car.sfront, car.direction), (car.sleft, car.vl), (car.sright, car.vr)):
+                sensors = group.sprites()
+                hit = next((s for s in range(n) if sensors[s].detection), n)
+                scale = car.sensors_len/n
+                start = (car.x + v[0]*scale*0.5, car.y + v[1]*scale*0.5)
+                middle = (car.x + v[0]*scale*(hit + 0.5), car.y + v[1]*scale*(hit + 0.5))
+                end = (car.x + v[0]*scale*(n + 0.5), car.y + v[1]*scale*(n + 0.5))
+                if hit > 0:
+                    pg.draw.line(screen, (0, 255, 0), start, middle, 2)
+                if hit < n:
+                    pg.draw.line(screen, (255, 0, 0), middle, end, 2)
+
+    def draw_dots(self, cars):
+        # One 2x2 dot per car written straight into the screen's pixels
+        if not cars:
+            return
+        x = np.clip(np.array([c.x for c in cars]).astype(np.int64), 0, WIDTH - 2)
+        y = np.clip(np.array([c.y for c in cars]).astype(np.int64), 0, HEIGHT - 2)
+        pixels = pg.surfarray.pixels2d(self.screen)
+        color = self.screen.map_rgb((255, 60, 60))
+        for dx in (0, 1):
+            for dy in (0, 1):
+                pixels[x + dx, y + dy] = color
+        del pixels
+
+    def background(self, sim):
+        # Track and checkpoints composited once into an opaque surface in the screen's format
+        key = (id(sim.track), self.draw_checkpoints)
+        if self.background_key != key:
+            background = pg.Surface(self.screen.get_size()).convert()
+            background.fill((100, 100, 100))
+            if self.draw_checkpoints:
+                background.blit(sim.checkpoints.image, (0, 0))
+            background.blit(sim.track.image, (0, 0))
+            self.background_key = key
+            self.background_surface = background
+        return self.background_surface
+
+    def draw(self, sim):
+        screen = self.screen
+        screen.blit(self.background(sim), (0, 0))
+        detailed, dots = self.split(sim)
+        self.draw_dots(dots)
+        screen.blits([(car.image, car.rect) for car in detailed], False)
+        if self.draw_sensors:
+            self.draw_rays(detailed)
+
+        screen.blit(self.text('score', "Highest Score: " + str(sim.highest_score)), (5, 10))
+        screen.blit(self.text('crashed', "Crashed: " + str(sim.cars_crashed) + "/" + str(sim.size)), (250, 10))
+        screen.blit(self.text('generation', "Generation: " + str(sim.generation)), (420, 10))
+        screen.blit(self.text('checkpoint', "Time between checkpoints: " +
+                              f'{(sim.tick - sim.check_tick)/TICK_RATE:.2f}'), (600, 10))
+
+        if sim.top in sim.cars:
+            screen.blit(self.text('top', "1"), sim.top.rect.topleft)
+        if sim.original in sim.cars:
+            screen.blit(self.text('original', "og"), sim.original.rect.topright)
+        if self.draw_profile:
+            self.draw_profiler(sim)
+
+
+def headless(generations, brain=None, seed=None, pretrained=None, record=None, profile=None, size=GEN_SIZE):
+    # Runs evolution as fast as the CPU allows, no window is opened
+    sim = Simulation(seed, pretrained, size=size)
+    if profile:
+        sim.profile(profiler.Profiler(profile))
+    if brain:
+        sim.load_brain(brain)
+    if record:
+        sim.replay = replay.Replay_Recorder(record, seed, {'size': size})
+        sim.attach(sim.replay)
+    sim.snapshot()
+    while sim.generation <= generations:
+        generation = sim.generation
+        sim.step()
+        if sim.generation != generation:
+            print(f'generation: {generation}, highest score: {sim.best_scores[-1]}, ticks: {sim.tick}')
+    sim.snapshotter.close()
+    sim.close()
+    return sim
+
+
+def pretrained_genomes(path):
+    params, meta = brains.load(path)
+    return brains.genomes(params)
+
+
+def drive(record=imitation.RECORD_PATH, seed=None):
+    # Drive one car by hand, every tick is appended to the record log
+    sim = Simulation(seed)
+    sim.drive(imitation.Recorder(record))
+    run(sim, Renderer())
+
+
+def main(brain=None, seed=None, pretrained=None, record=None, profile=None, size=GEN_SIZE, fps=FRAME_RATE):
+    sim = Simulation(seed, pretrained, size=size)
+    if profile:
+        sim.profile(profiler.Profiler(profile))
+    if brain:
+        sim.load_brain(brain)
+    if record:
+        sim.replay = replay.Replay_Recorder(record, seed, {'size': size})
+        sim.attach(sim.replay)
+    renderer = Renderer(fps)
+    if profile:
+        renderer.draw_profile = True
+    run(sim, renderer)
+
+
+def play(path):
+    # Plays a replay back headless as fast as possible and checks it matches the recording
+    player = replay.Replay_Player(path)
+    sim = Simulation(player.seed, size=player.meta.get('size', GEN_SIZE))
+    sim.driver = player
+    # Recorded controls replace the networks, so sensors need not be cast
+    sim.sensing = False
+    start = time.perf_counter()
+    while not player.done:
+        player.prepare(sim)
+        sim.step()
+    exact = player.finish()
+    seconds = time.perf_counter() - start
+    print(f'ticks: {player.tick}, generations: {len(player.starts)}, ' +
+          f'{player.tick/max(seconds, 1e-9)/TICK_RATE:.1f}x real time, ' +
+          ('bit exact' if exact else 'mismatches: '+str(player.mismatches)))
+    return exact
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description='Neural network self driving cars')
+    parser.add_argument('--headless', type=int, metavar='GENERATIONS',
+                        help='evolve without a window for this many generations')
+    parser.add_argument('--load', metavar='PATH',
+                        help='start from a brain saved with B or by a headless run')
+    parser.add_argument('--seed', type=int, default=None,
+                        help='seed for every random draw, same seed same run')
+    parser.add_argument('--drive', action='store_true',
+                        help='drive a car with W/A/S/D and record it for imitation.py')
+    parser.add_argument('--record', metavar='PATH', default=imitation.RECORD_PATH,
+                        help='driving log --drive appends to')
+    parser.add_argument('--replay', metavar='PATH',
+                        help='record the run to a replay file, needs --seed to be reproducible')
+    parser.add_argument('--play', metavar='PATH',
+                        help='play a replay back headless and check it is bit exact')
+    parser.add_argument('--profile', metavar='PATH', nargs='?', const=profiler.PROFILE_PATH,
+                        help='time every phase of every tick to a .jsonl or .csv file, P toggles the overlay')
+    parser.add_argument('--population', type=int, default=GEN_SIZE, help='cars per generation')
+    parser.add_argument('--fps', type=int, default=FRAME_RATE,
+                        help='frames drawn per second, the simulation still ticks TICK_RATE times a second')
+    parser.add_argument('--pretrained', metavar='PATH',
+                        help='seed the first generation with the genomes of this brain file')
+    args = parser.parse_args()
+    pretrained = pretrained_genomes(args.pretrained) if args.pretrained else None
+    if args.play:
+        sys.exit(0 if play(args.play) else 1)
+    elif args.drive:
+        drive(args.record, args.seed)
+    elif args.headless:
+        headless(args.headless, args.load, args.seed, pretrained, args.replay, args.profile, args.population)
+    else:
+        main(args.load, args.seed, pretrained, args.replay, args.profile, args.population, args.fps)
@@ -0,0 +1,37 @@
+import hashlib
+import os
+import numpy as np
+import pygame as pg
+
+CACHE_DIR = '.cache'  # Created next to the images
+
+
+def load_mask(path):
+    # Boolean occupancy grid indexed [y, x], True where pg.mask.from_surface sets a bit
+    image = pg.image.load(path)
+    return pg.surfarray.array_alpha(image).T > 127
+
+
+def file_hash(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()[:16]
+
+
+def cached(path, kind, build):
+    # Array derived from the image at path, saved once as .npy keyed by the image's hash and
+    # memory mapped read only, so every process shares the same pages without copying
+    directory = os.path.join(os.path.dirname(path), CACHE_DIR)
+    name = os.path.splitext(os.path.basename(path))[0]
+    cache_path = os.path.join(directory, name+'-'+kind+'-'+file_hash(path)+'.npy')
+    if not os.path.exists(cache_path):
+        os.makedirs(directory, exist_ok=True)
+        # Write then rename so workers building at the same time never read half a file
+        temp_path = cache_path+'.'+str(os.getpid())+'.tmp'
+        with open(temp_path, 'wb') as f:
+            np.save(f, build())
+        os.replace(temp_path, cache_path)
+    return np.load(cache_path, mmap_mode='r')
+
+
+def cached_mask(path):
+    return cached(path, 'mask', lambda: load_mask(path))
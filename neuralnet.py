@@ -1,33 +1,88 @@
+import queue
+import threading
+import time
 import numpy as np
-import nnfs
 from nnfs.datasets import spiral_data, vertical_data
-from numpy.core.shape_base import _accumulate
-from numpy.lib.function_base import _percentile_dispatcher
-from numpy.lib.ufunclike import _deprecate_out_named_y
 
-nnfs.init()
+# Used when no np.random.Generator is passed in, pass a seeded one per run for reproducible results
+RNG = np.random.default_rng()
+# Parameters, activations and gradients are kept in DTYPE. exp and log run in at least float32
+DTYPE = np.float32
+
+def standard_normal(rng, shape, dtype=DTYPE):
+    # Generators only draw float32 and float64, anything else is drawn as float32 and cast
+    if np.dtype(dtype) in (np.float32, np.float64):
+        return rng.standard_normal(shape, dtype=dtype)
+    return rng.standard_normal(shape, dtype=np.float32).astype(dtype)
+
+def compute_dtype(dtype):
+    # Dtype to do numerically sensitive math in, float16 is promoted
+    return np.promote_types(dtype, np.float32)
+
+def mutate_genome(parent, n, rng=None, wmf=0.01, bmf=0.01, dtype=DTYPE):
+    # parent [w1, b1, w2, b2, ...], returns the same list stacked for n children, shape (n, ...) each.
+    # wmf and bmf are weight and bias mutation factors, scalars or one per child.
+    # All noise comes from a single standard_normal call, one draw per parameter
+    if rng is None:
+        rng = RNG
+    noise = standard_normal(rng, (n, sum(np.size(p) for p in parent)), dtype)
+    children = []
+    start = 0
+    for l, p in enumerate(parent):
+        p = np.asarray(p)
+        child = noise[:, start:start + p.size].reshape((n,) + p.shape)
+        factor = np.asarray(wmf if l % 2 == 0 else bmf, dtype=noise.dtype)
+        child *= factor.reshape(factor.shape + (1,)*p.ndim)
+        child += p
+        children.append(child)
+        start += p.size
+    return children
 
 class Layer_Dense:
-    def __init__(self, n_inputs, n_neurons, i_weight=0.01, i_bias=0.0):
-        self.weights = i_weight * np.random.randn(n_inputs, n_neurons)
-        self.biases = i_bias * np.random.randn(1, n_neurons)
+    def __init__(self, n_inputs, n_neurons, i_weight=0.01, i_bias=0.0, rng=None, dtype=DTYPE):
+        if rng is None:
+            rng = RNG
+        self.dtype = np.dtype(dtype)
+        self.weights = (i_weight * standard_normal(rng, (n_inputs, n_neurons), dtype)).astype(dtype)
+        self.biases = (i_bias * standard_normal(rng, (1, n_neurons), dtype)).astype(dtype)
+        self.dweights = None
+        self.dbiases = None
     
-    def inherit_and_evolve_WB(self, old_w, old_b, wmf=0.01, bmf=0.01):
+    @classmethod
+    def inherited(cls, old_w, old_b, dtype=DTYPE):
+        # Layer holding inherited weights and biases, skips the random initialization
+        layer = cls.__new__(cls)
+        layer.dtype = np.dtype(dtype)
+        layer.inherit_WB(old_w, old_b)
+        layer.dweights = None
+        layer.dbiases = None
+        return layer
+
+    def inherit_and_evolve_WB(self, old_w, old_b, wmf=0.01, bmf=0.01, rng=None):
         # old_w inherited weight, old_b inherited bias, wmf weight mutation factor, bmf bias mutation factor
-        self.weights = old_w + np.random.randn(self.weights.shape[0], self.weights.shape[1])*wmf
-        self.biases = old_b + np.random.randn(1, self.biases.shape[0])*bmf
+        if rng is None:
+            rng = RNG
+        self.weights = (old_w + standard_normal(rng, self.weights.shape, self.dtype)*wmf).astype(self.dtype)
+        self.biases = (old_b + standard_normal(rng, self.biases.shape, self.dtype)*bmf).astype(self.dtype)
     
     def inherit_WB(self, old_w, old_b):
-        self.weights = old_w
-        self.biases = old_b
+        # No copy when the inherited values already have the layer's dtype
+        self.weights = np.asarray(old_w, dtype=self.dtype)
+        self.biases = np.asarray(old_b, dtype=self.dtype)
 
     def forward(self, inputs):
+        inputs = np.asarray(inputs, dtype=self.dtype)
         self.inputs = inputs
         self.output = np.dot(inputs, self.weights) + self.biases
 
     def backward(self, dvalues):
-        self.dweights = np.dot(self.inputs.T, dvalues)
-        self.dbiases = np.sum(dvalues, axis=0, keepdims=True)
+        # Gradients are written into the existing buffers, which may be views an Optimizer registered
+        if self.dweights is None:
+            self.dweights = np.dot(self.inputs.T, dvalues)
+            self.dbiases = np.sum(dvalues, axis=0, keepdims=True)
+        else:
+            np.matmul(self.inputs.T, dvalues, out=self.dweights)
+            np.sum(dvalues, axis=0, keepdims=True, out=self.dbiases)
         self.dinputs = np.dot(dvalues, self.weights.T)
 
 class Activation_ReLU:
@@ -39,21 +94,100 @@ class Activation_ReLU:
         self.dinputs = dvalues.copy()
         self.dinputs[self.inputs <= 0] = 0
 
+class Inference_Network:
+    # Forward only Dense + ReLU stack for driving. Uses the layers' current weights and biases
+    # but keeps no intermediates for backward, every pass runs in preallocated buffers.
+    # Fill self.inputs then call forward(), the returned array is reused by the next pass
+    def __init__(self, layers, batch=1):
+        self.layers = layers
+        self.batch = batch
+        self.dtype = None
+        self.allocate()
+
+    def allocate(self):
+        # Buffers follow the weights' dtype so np.dot never has to cast
+        self.dtype = np.result_type(*[layer.weights for layer in self.layers])
+        self.inputs = np.zeros((self.batch, self.layers[0].weights.shape[0]), dtype=self.dtype)
+        self.buffers = [np.empty((self.batch, layer.weights.shape[1]), dtype=self.dtype)
+                        for layer in self.layers]
+        self.output = self.buffers[-1]
+
+    def forward(self):
+        if self.layers[0].weights.dtype != self.dtype:
+            inputs = self.inputs
+            self.allocate()
+            self.inputs[...] = inputs
+        values = self.inputs
+        for layer, out in zip(self.layers, self.buffers):
+            np.dot(values, layer.weights, out=out)
+            np.add(out, layer.biases, out=out)
+            np.maximum(out, 0., out=out)
+            values = out
+        return self.output
+
+class Population_Network:
+    # Dense + ReLU layers of a whole population, weights (pop, in, out), biases (pop, 1, out)
+    def __init__(self, pop, layer_sizes, i_weight=0.01, i_bias=0.0, rng=None, dtype=DTYPE):
+        if rng is None:
+            rng = RNG
+        self.dtype = np.dtype(dtype)
+        self.pop = pop
+        self.layer_sizes = layer_sizes
+        self.weights = []
+        self.biases = []
+        for n_inputs, n_neurons in zip(layer_sizes[:-1], layer_sizes[1:]):
+            self.weights.append((i_weight * standard_normal(rng, (pop, n_inputs, n_neurons), dtype)).astype(dtype))
+            self.biases.append((i_bias * standard_normal(rng, (pop, 1, n_neurons), dtype)).astype(dtype))
+
+    def forward(self, inputs, mask=None):
+        # inputs (pop, in), mask (pop,) bool, masked out members skip the pass and output zeros
+        inputs = np.asarray(inputs, dtype=self.dtype)
+        if mask is None or mask.all():
+            weights = self.weights
+            biases = self.biases
+        else:
+            index = np.flatnonzero(mask)
+            weights = [w[index] for w in self.weights]
+            biases = [b[index] for b in self.biases]
+            inputs = inputs[index]
+
+        values = inputs[:, None, :]
+        for w, b in zip(weights, biases):
+            values = np.maximum(0, np.matmul(values, w) + b)
+        values = values[:, 0, :]
+
+        if mask is None or mask.all():
+            self.output = values
+        else:
+            self.output = np.zeros((self.pop, values.shape[1]), dtype=values.dtype)
+            self.output[index] = values
+        return self.output
+
+    def get_genome(self, i):
+        # Member i as [w1, b1, w2, b2, ...] shaped like Layer_Dense weights and biases
+        genome = []
+        for w, b in zip(self.weights, self.biases):
+            genome.append(w[i].copy())
+            genome.append(b[i].copy())
+        return genome
+
+    def set_genome(self, i, genome):
+        for l in range(len(self.weights)):
+            self.weights[l][i] = genome[2*l]
+            self.biases[l][i] = genome[2*l + 1]
+
 class Activation_Softmax:
     def forward(self, inputs):
         self.inputs = inputs
-        exp_values = np.exp(inputs - np.max(inputs, axis=1, keepdims=True))
+        # Shifted exp and the normalization run promoted, the output goes back to the inputs' dtype
+        shifted = (inputs - np.max(inputs, axis=1, keepdims=True)).astype(compute_dtype(inputs.dtype))
+        exp_values = np.exp(shifted)
         probabilities = exp_values / np.sum(exp_values, axis=1, keepdims=True)
-        self.output = probabilities
+        self.output = probabilities.astype(inputs.dtype, copy=False)
 
     def backward(self, dvalues):
-        self.dinputs = np.empty_like(dvalues)
-
-        for index, (single_output, single_dvalues) in enumerate(zip(self.output, dvalues)):
-            single_output = single_output.reshape(-1, 1)
-            jacobian_matrix = np.diagflat(
-                single_output) - np.dot(single_output, single_output.T)
-            self.dinputs[index] = np.dot(jacobian_matrix, single_dvalues)
+        # Jacobian times dvalues for every row at once, J = diag(s) - s s^T gives s * (d - s.d)
+        self.dinputs = self.output * (dvalues - np.sum(self.output * dvalues, axis=1, keepdims=True))
 
 class Activation_Sigmoid:
     # Forward pass
@@ -61,7 +195,7 @@ class Activation_Sigmoid:
         # Save input and calculate/save output
         # of the sigmoid function
         self.inputs = inputs
-        self.output = 1 / (1 + np.exp(-inputs))
+        self.output = (1 / (1 + np.exp(-inputs.astype(compute_dtype(inputs.dtype))))).astype(inputs.dtype, copy=False)
     # Backward pass
     def backward(self, dvalues):
         # Derivative - calculates from output of the sigmoid function
@@ -76,7 +210,8 @@ class Loss:
 class Loss_CatergoricalCrossentropy(Loss):
     def forward(self, y_pred, y_true):
         samples = len(y_pred)
-        y_pred_clipped = np.clip(y_pred, 1e-7, 1 - 1e-7)
+        # 1 - 1e-7 rounds to 1 in float16, clip and log in a wide enough dtype
+        y_pred_clipped = np.clip(y_pred.astype(compute_dtype(y_pred.dtype)), 1e-7, 1 - 1e-7)
 
         if len(y_true.shape) == 1:
             correct_confidences = y_pred_clipped[
@@ -96,15 +231,40 @@ class Loss_CatergoricalCrossentropy(Loss):
         labels = len(dvalues[0])
 
         if len(y_true.shape) == 1:
-            y_true = np.eye(labels)[y_true]
+            y_true = np.eye(labels, dtype=dvalues.dtype)[y_true]
 
         self.dinputs = -y_true / dvalues
-        self.dinputs = self.dinputs / samples
+        # Dividing by the int would upcast float16 under value based casting
+        self.dinputs = self.dinputs / self.dinputs.dtype.type(samples)
+
+class Loss_BinaryCrossentropy(Loss):
+    # Independent yes/no outputs, e.g. a sigmoid per control
+    def forward(self, y_pred, y_true):
+        y_pred_clipped = np.clip(y_pred.astype(compute_dtype(y_pred.dtype)), 1e-7, 1 - 1e-7)
+        sample_losses = -(y_true * np.log(y_pred_clipped) +
+                          (1 - y_true) * np.log(1 - y_pred_clipped))
+        return np.mean(sample_losses, axis=-1)
+
+    def backward(self, dvalues, y_true):
+        samples = len(dvalues)
+        outputs = len(dvalues[0])
+        clipped_dvalues = np.clip(dvalues, 1e-7, 1 - 1e-7)
+        self.dinputs = -(y_true / clipped_dvalues -
+                         (1 - y_true) / (1 - clipped_dvalues)) / dvalues.dtype.type(outputs)
+        self.dinputs = self.dinputs / self.dinputs.dtype.type(samples)
 
 class Activation_Softmax_Loss_CategoricalCrossentropy():
-    def __init__(self):
-        self.activation = Activation_Softmax()
-        self.loss = Loss_CatergoricalCrossentropy()
+    # Softmax and cross entropy together, the gradient wrt the logits is just (s - y) / samples
+    def __init__(self, activation=None, loss=None):
+        self.activation = activation or Activation_Softmax()
+        self.loss = loss or Loss_CatergoricalCrossentropy()
+
+    @classmethod
+    def fuse(cls, activation, loss):
+        # The fused pair when a softmax output goes straight into cross entropy, else None
+        if isinstance(activation, Activation_Softmax) and isinstance(loss, Loss_CatergoricalCrossentropy):
+            return cls(activation, loss)
+        return None
 
     def forward(self, inputs, y_true):
         self.activation.forward(inputs)
@@ -119,7 +279,8 @@ class Activation_Softmax_Loss_CategoricalCrossentropy():
 
         self.dinputs = dvalues.copy()
         self.dinputs[range(samples), y_true] -= 1
-        self.dinputs = self.dinputs / samples
+        # Dividing by the int would upcast float16 under value based casting
+        self.dinputs = self.dinputs / self.dinputs.dtype.type(samples)
 
 class Optimizer_SGD:
     def __init__(self, Learning_rate=1., decay=0., momentum=0.):
@@ -135,6 +296,7 @@ class Optimizer_SGD:
                 (1. / (1. + self.decay * self.iterations))
 
     def update_params(self, layer):
+        # Python float learning rates and momentum keep the parameters' dtype, momentums follow it too
         if self.momentum:
             if not hasattr(layer, 'weight_momentums'):
                 layer.weight_momentums = np.zeros_like(layer.weights)
@@ -160,49 +322,311 @@ class Optimizer_SGD:
     def post_update_params(self):
         self.iterations += 1
 
-if __name__ == "__main__":
-    X, y = spiral_data(samples=100, classes=3)
-
-    # print(X)
-
-    dense1 = Layer_Dense(2, 64)
-
-    activation1 = Activation_ReLU()
-
-    dense2 = Layer_Dense(64, 3)
-
-    loss_activation = Activation_Softmax_Loss_CategoricalCrossentropy()
-
-    optimizer = Optimizer_SGD(Learning_rate=1, decay=1e-3, momentum=0.9)
-
-    # for epoch in range(10001):
-    #     dense1.forward(X)
-    #     activation1.forward(dense1.output)
-    #     dense2.forward(activation1.output)
-
-    #     loss = loss_activation.forward(dense2.output, y)
-
-    #     # print('loss:', loss)
-
-    #     predictions = np.argmax(loss_activation.output, axis=1)
-    #     if len(y.shape) == 2:
-    #         y = np.argmax(y, axis=1)
-    #     accuracy = np.mean(predictions == y)
+class Optimizer:
+    # Base for optimizers that allocate their state when layers are registered and update in
+    # place with out= ufuncs. With flat=True every layer's weights and biases are moved into one
+    # contiguous buffer, the layers keep views into it, and gradients into a matching buffer,
+    # so a step is a few large vector ops. Replacing a registered layer's arrays, as inherit_WB
+    # does, detaches it, register again afterwards
+    def __init__(self, learning_rate, decay=0., flat=False):
+        self.learning_rate = learning_rate
+        self.current_learning_rate = learning_rate
+        self.decay = decay
+        self.flat = flat
+        self.iterations = 0
+        self.params = []
+        self.grads = []
+
+    def register(self, layers):
+        self.layers = layers
+        if self.flat:
+            arrays = [a for layer in layers for a in (layer.weights, layer.biases)]
+            params = np.empty(sum(a.size for a in arrays), dtype=np.result_type(*arrays))
+            grads = np.zeros_like(params)
+            start = 0
+            for layer in layers:
+                for name in ('weights', 'biases'):
+                    value = getattr(layer, name)
+                    view = params[start:start + value.size].reshape(value.shape)
+                    view[...] = value
+                    setattr(layer, name, view)
+                    setattr(layer, 'd' + name, grads[start:start + value.size].reshape(value.shape))
+                    start += value.size
+            self.params = [params]
+            self.grads = [grads]
+        else:
+            self.params = []
+            self.grads = []
+            for layer in layers:
+                layer.dweights = np.zeros_like(layer.weights)
+                layer.dbiases = np.zeros_like(layer.biases)
+                self.params += [layer.weights, layer.biases]
+                self.grads += [layer.dweights, layer.dbiases]
+        self.scratch = [np.empty_like(p) for p in self.params]
+        self.state = [self.allocate(p) for p in self.params]
+
+    def allocate(self, param):
+        # Per parameter state arrays, subclasses override
+        return ()
+
+    def step(self):
+        if self.decay:
+            self.current_learning_rate = self.learning_rate * \
+                (1. / (1. + self.decay * self.iterations))
+        for param, grad, scratch, state in zip(self.params, self.grads, self.scratch, self.state):
+            self.update(param, grad, scratch, *state)
+        self.iterations += 1
 
-    #     # print('acc:', accuracy)
+class Optimizer_Adagrad(Optimizer):
+    def __init__(self, learning_rate=1., decay=0., epsilon=1e-7, flat=False):
+        super().__init__(learning_rate, decay, flat)
+        self.epsilon = epsilon
+
+    def allocate(self, param):
+        return (np.zeros_like(param),)
+
+    def update(self, param, grad, scratch, cache):
+        # cache += g^2, param -= lr * g / (sqrt(cache) + eps)
+        np.multiply(grad, grad, out=scratch)
+        np.add(cache, scratch, out=cache)
+        np.sqrt(cache, out=scratch)
+        np.add(scratch, self.epsilon, out=scratch)
+        np.divide(grad, scratch, out=scratch)
+        np.multiply(scratch, self.current_learning_rate, out=scratch)
+        np.subtract(param, scratch, out=param)
+
+class Optimizer_RMSprop(Optimizer):
+    def __init__(self, learning_rate=0.001, decay=0., epsilon=1e-7, rho=0.9, flat=False):
+        super().__init__(learning_rate, decay, flat)
+        self.epsilon = epsilon
+        self.rho = rho
+
+    def allocate(self, param):
+        return (np.zeros_like(param),)
+
+    def update(self, param, grad, scratch, cache):
+        # cache = rho * cache + (1 - rho) * g^2, param -= lr * g / (sqrt(cache) + eps)
+        np.multiply(grad, grad, out=scratch)
+        np.multiply(scratch, 1 - self.rho, out=scratch)
+        np.multiply(cache, self.rho, out=cache)
+        np.add(cache, scratch, out=cache)
+        np.sqrt(cache, out=scratch)
+        np.add(scratch, self.epsilon, out=scratch)
+        np.divide(grad, scratch, out=scratch)
+        np.multiply(scratch, self.current_learning_rate, out=scratch)
+        np.subtract(param, scratch, out=param)
+
+class Optimizer_Adam(Optimizer):
+    def __init__(self, learning_rate=0.001, decay=0., epsilon=1e-7, beta_1=0.9, beta_2=0.999, flat=False):
+        super().__init__(learning_rate, decay, flat)
+        self.epsilon = epsilon
+        self.beta_1 = beta_1
+        self.beta_2 = beta_2
+
+    def allocate(self, param):
+        return (np.zeros_like(param), np.zeros_like(param))
+
+    def update(self, param, grad, scratch, momentum, cache):
+        # Bias corrections folded into the step size so no corrected copies are needed
+        step = self.iterations + 1
+        rate = self.current_learning_rate * np.sqrt(1 - self.beta_2 ** step) / (1 - self.beta_1 ** step)
+        np.multiply(momentum, self.beta_1, out=momentum)
+        np.multiply(grad, 1 - self.beta_1, out=scratch)
+        np.add(momentum, scratch, out=momentum)
+        np.multiply(grad, grad, out=scratch)
+        np.multiply(scratch, 1 - self.beta_2, out=scratch)
+        np.multiply(cache, self.beta_2, out=cache)
+        np.add(cache, scratch, out=cache)
+        np.sqrt(cache, out=scratch)
+        np.add(scratch, self.epsilon, out=scratch)
+        np.divide(momentum, scratch, out=scratch)
+        np.multiply(scratch, rate, out=scratch)
+        np.subtract(param, scratch, out=param)
+
+class Batch_Loader:
+    # Shuffled mini batches of (X, y). source is either an (X, y) pair of arrays or a function
+    # returning an iterable of (X, y) chunks, called once per epoch, for data read from disk in
+    # pieces. Chunks are shuffled on their own and leftovers roll over into the next chunk.
+    # Iterating runs the batching on a background thread, prefetch batches ahead
+    def __init__(self, source, batch_size=32, shuffle=True, prefetch=2, rng=None):
+        if rng is None:
+            rng = RNG
+        self.source = source
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.prefetch = prefetch
+        self.rng = rng
+
+    def chunks(self):
+        if callable(self.source):
+            return self.source()
+        return [self.source]
+
+    def batches(self):
+        X_rest = y_rest = None
+        for X, y in self.chunks():
+            X = np.asarray(X)
+            y = np.asarray(y)
+            if X_rest is not None:
+                X = np.concatenate((X_rest, X))
+                y = np.concatenate((y_rest, y))
+            if self.shuffle:
+                order = self.rng.permutation(len(X))
+                X = X[order]
+                y = y[order]
+            full = len(X) - len(X) % self.batch_size
+            for start in range(0, full, self.batch_size):
+                yield X[start:start + self.batch_size], y[start:start + self.batch_size]
+            X_rest = X[full:]
+            y_rest = y[full:]
+        if X_rest is not None and len(X_rest):
+            yield X_rest, y_rest
+
+    def __iter__(self):
+        if not self.prefetch:
+            yield from self.batches()
+            return
+        batches = queue.Queue(self.prefetch)
+        done = object()
+        stop = threading.Event()
+
+        def put(item):
+            # Gives up once the consumer stopped, it may never empty the full queue again
+            while not stop.is_set():
+                try:
+                    batches.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def produce():
+            try:
+                for batch in self.batches():
+                    if not put(batch):
+                        return
+                put(done)
+            except Exception as error:
+                put(error)
+
+        thread = threading.Thread(target=produce, daemon=True)
+        thread.start()
+        try:
+            while True:
+                batch = batches.get()
+                if batch is done:
+                    break
+                if isinstance(batch, Exception):
+                    raise batch
+                yield batch
+        finally:
+            # The consumer may stop early, let the producer finish instead of blocking on a full queue
+            stop.set()
+            thread.join()
+
+class Model:
+    # Layers chained in order with a loss and an optimizer. Softmax followed by
+    # categorical cross entropy is fused automatically for the backward pass
+    def __init__(self):
+        self.layers = []
+        self.loss = None
+        self.optimizer = None
+        self.fused = None
+
+    def add(self, layer):
+        self.layers.append(layer)
+
+    def set(self, loss, optimizer):
+        self.loss = loss
+        self.optimizer = optimizer
+        if isinstance(optimizer, Optimizer):
+            optimizer.register([layer for layer in self.layers if hasattr(layer, 'weights')])
+        self.fused = Activation_Softmax_Loss_CategoricalCrossentropy.fuse(self.layers[-1], loss)
+
+    def forward(self, X):
+        for layer in self.layers:
+            layer.forward(X)
+            X = layer.output
+        return X
+
+    def backward(self, output, y):
+        if self.fused is not None:
+            self.fused.backward(output, y)
+            dvalues = self.fused.dinputs
+            layers = self.layers[:-1]
+        else:
+            self.loss.backward(output, y)
+            dvalues = self.loss.dinputs
+            layers = self.layers
+        for layer in reversed(layers):
+            layer.backward(dvalues)
+            dvalues = layer.dinputs
+
+    def step(self):
+        if isinstance(self.optimizer, Optimizer):
+            self.optimizer.step()
+            return
+        self.optimizer.pre_update_params()
+        for layer in self.layers:
+            if hasattr(layer, 'weights'):
+                self.optimizer.update_params(layer)
+        self.optimizer.post_update_params()
+
+    def accuracy(self, output, y):
+        y = np.asarray(y)
+        if output.shape[1] > 1 and y.ndim == 1:
+            return np.mean(np.argmax(output, axis=1) == y)
+        if output.shape[1] > 1 and y.shape == output.shape and isinstance(self.loss, Loss_CatergoricalCrossentropy):
+            return np.mean(np.argmax(output, axis=1) == np.argmax(y, axis=1))
+        # Independent outputs, each rounded to 0 or 1
+        return np.mean((output > 0.5) == (y > 0.5))
+
+    def train(self, data, epochs=1, batch_size=32, shuffle=True, prefetch=2, print_every=1, rng=None):
+        # data is an (X, y) pair, a chunk function as taken by Batch_Loader or a Batch_Loader.
+        # Returns one dict per epoch with mean loss, accuracy and samples/s
+        loader = data if isinstance(data, Batch_Loader) else \
+            Batch_Loader(data, batch_size, shuffle, prefetch, rng)
+        history = []
+        for epoch in range(1, epochs + 1):
+            start = time.perf_counter()
+            samples = 0
+            loss_sum = 0.
+            correct = 0.
+            for X, y in loader:
+                output = self.forward(X)
+                loss_sum += self.loss.calculate(output, y) * len(X)
+                correct += self.accuracy(output, y) * len(X)
+                self.backward(output, y)
+                self.step()
+                samples += len(X)
+            seconds = time.perf_counter() - start
+            history.append({'epoch': epoch, 'loss': loss_sum / max(samples, 1),
+                            'acc': correct / max(samples, 1),
+                            'samples/s': samples / max(seconds, 1e-9)})
+            if print_every and not epoch % print_every:
+                print(f'epoch: {epoch}, ' +
+                      f'acc: {history[-1]["acc"]:.3f}, ' +
+                      f'loss: {history[-1]["loss"]:.3f}, ' +
+                      f'lr: {self.optimizer.current_learning_rate:.5f}, ' +
+                      f'samples/s: {history[-1]["samples/s"]:.0f}')
+        return history
+
+    def predict(self, X, batch_size=1024):
+        return np.concatenate([self.forward(X[start:start + batch_size]).copy()
+                               for start in range(0, len(X), batch_size)])
 
-    #     if not epoch % 100:
-    #         print(f'epoch: {epoch}, ' +
-    #               f'acc: {accuracy:.3f}, ' +
-    #               f'loss: {loss:.3f}, ' +
-    #               f'lr : {optimizer.current_learning_rate}')
+if __name__ == "__main__":
+    # spiral_data draws from the global np.random state
+    np.random.seed(0)
+    X, y = spiral_data(samples=100, classes=3)
 
-    #     loss_activation.backward(loss_activation.output, y)
-    #     dense2.backward(loss_activation.dinputs)
-    #     activation1.backward(dense2.dinputs)
-    #     dense1.backward(activation1.dinputs)
+    rng = np.random.default_rng(0)
+    model = Model()
+    model.add(Layer_Dense(2, 64, rng=rng))
+    model.add(Activation_ReLU())
+    model.add(Layer_Dense(64, 3, rng=rng))
+    model.add(Activation_Softmax())
+    model.set(Loss_CatergoricalCrossentropy(),
+              Optimizer_SGD(Learning_rate=0.1, decay=1e-4, momentum=0.9))
 
-    #     optimizer.pre_update_params()
-    #     optimizer.update_params(dense1)
-    #     optimizer.update_params(dense2)
-    #     optimizer.post_update_params()
+    model.train((X, y), epochs=1001, batch_size=32, print_every=100, rng=rng)
@@ -0,0 +1,117 @@
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import brains
+import engine
+import neuralnet as nn
+import evolution
+from main import TRACK_N, TICK_RATE, GEN_SIZE, WM_F, BM_F
+
+MAX_TICKS = 60 * TICK_RATE  # Longest evaluation of one generation
+SHARDS_PER_WORKER = 4
+
+# Worker state, loaded once by _init_worker in every process
+_data = None
+
+
+def _init_worker(track_n):
+    global _data
+    _data = engine.Track_Data(track_n)
+
+
+def _evaluate_shard(genomes, max_ticks):
+    return engine.Engine(_data, genomes).run(max_ticks)
+
+
+class Parallel_Evaluator:
+    # Shards a generation's genomes across processes and gathers per car fitness in order
+    def __init__(self, workers=None, track_n=TRACK_N, max_ticks=MAX_TICKS):
+        self.workers = workers or os.cpu_count()
+        self.max_ticks = max_ticks
+        # Build the mask cache once here so workers only attach to it
+        engine.Track_Data(track_n)
+        self.pool = ProcessPoolExecutor(
+            self.workers, initializer=_init_worker, initargs=(track_n,))
+
+    def evaluate(self, genomes):
+        # Every car is scored independently, so the split never changes the result
+        shards = np.array_split(np.arange(len(genomes)),
+                                min(len(genomes), self.workers*SHARDS_PER_WORKER))
+        # Seeded genomes travel as theta and seeds, workers rebuild the members
+        if isinstance(genomes, evolution.Seeded_Genomes):
+            batches = [genomes.subset(shard) for shard in shards]
+        else:
+            batches = [[genomes[i] for i in shard] for shard in shards]
+        results = self.pool.map(_evaluate_shard, batches,
+                                [self.max_ticks]*len(batches))
+        return np.concatenate(list(results))
+
+    def close(self):
+        self.pool.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def evolve_population(best, rng, size=GEN_SIZE):
+    # Same scheme as genCars: best is kept, member i gets noise scaled by i
+    factors = np.arange(size)
+    children = nn.mutate_genome(best, size, rng, wmf=WM_F*factors, bmf=BM_F*factors)
+    return [[child[i] for child in children] for i in range(size)]
+
+
+def train(generations, seed=0, workers=None, size=GEN_SIZE, track_n=TRACK_N, algorithm=None):
+    # Deterministic for a seed whatever the worker count, only the parent process draws random numbers.
+    # algorithm is anything with ask()/tell(fitness)/best_genome() like evolution.Genetic_Algorithm
+    # or evolution.OpenAI_ES, None keeps the genCars scheme
+    rng = np.random.default_rng(seed)
+    if algorithm is None:
+        genomes = [engine.random_genome(rng) for _ in range(size)]
+        best = genomes[0]
+    else:
+        best = algorithm.best_genome()
+    # With 0 generations the starting genome is saved unevaluated
+    history = []
+    with Parallel_Evaluator(workers, track_n) as evaluator:
+        for generation in range(1, generations + 1):
+            if algorithm is not None:
+                genomes = algorithm.ask()
+            scores = evaluator.evaluate(genomes)
+            history.append(float(scores.max()))
+            print(f'generation: {generation}, best progress: {history[-1]:.1f} px')
+            if algorithm is not None:
+                algorithm.tell(scores)
+                best = algorithm.best_genome()
+            else:
+                best = genomes[int(np.argmax(scores))]
+                genomes = evolve_population(best, rng, size)
+    brains.save(brains.BRAIN_PATH, [best], generation=generations, rng=brains.get_rng_state(rng),
+                hyperparameters={'TRACK_N': track_n, 'GEN_SIZE': size, 'WM_F': WM_F, 'BM_F': BM_F})
+    return best, history
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Evolve cars on every CPU core')
+    parser.add_argument('generations', type=int)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--size', type=int, default=GEN_SIZE)
+    parser.add_argument('--track', type=int, default=TRACK_N)
+    parser.add_argument('--selection', choices=sorted(evolution.SELECTIONS),
+                        help='use the genetic algorithm with this selection instead of the genCars scheme')
+    parser.add_argument('--crossover', choices=sorted(evolution.CROSSOVERS), default='uniform')
+    parser.add_argument('--strategy', choices=sorted(evolution.STRATEGIES),
+                        help='use an evolution strategy instead of the genCars scheme')
+    args = parser.parse_args()
+    algorithm = None
+    if args.strategy:
+        algorithm = evolution.STRATEGIES[args.strategy](engine.LAYER_SIZES, args.size, seed=args.seed)
+    elif args.selection:
+        algorithm = evolution.Genetic_Algorithm(engine.LAYER_SIZES, args.size, seed=args.seed,
+                                                selection=args.selection, crossover=args.crossover)
+    train(args.generations, seed=args.seed, workers=args.workers, size=args.size,
+          track_n=args.track, algorithm=algorithm)
@@ -0,0 +1,91 @@
+import numpy as np
+
+# Car Mechanics, same values as main.Car
+ACCELERATION = 0.15
+DESCELERATION = 0.04
+BREAKING_FORCE = 0.2
+TOP_SPEED = 4.0
+ROTATION_SPEED = 2.0
+
+
+class Population:
+    # Physics state of a whole generation of cars, one array entry per car
+    def __init__(self, size, init_x, init_y):
+        self.size = size
+        self.acceleration = ACCELERATION
+        self.desceleration = DESCELERATION
+        self.breaking_force = BREAKING_FORCE
+        self.top_speed = TOP_SPEED
+        self.rotation_speed = ROTATION_SPEED
+        self.x = np.full(size, init_x, dtype=np.float64)
+        self.y = np.full(size, init_y, dtype=np.float64)
+        self.heading = np.zeros(size, dtype=np.int64)  # Angle in rotation_speed steps
+        self.angle = np.zeros(size, dtype=np.float64)
+        self.speed = np.zeros(size, dtype=np.float64)
+        self.direction = np.zeros((size, 2), dtype=np.float64)
+        self.direction[:, 0] = 1.0
+        self.crashed = np.zeros(size, dtype=bool)
+        # Outputs
+        self.turn = np.zeros(size, dtype=np.int8)
+        self.accelerate = np.zeros(size, dtype=bool)
+        self.brake = np.zeros(size, dtype=bool)
+
+    def controls(self, outputs):
+        # outputs (size, 4): accelerate, brake, turn left, turn right, any non zero value is on
+        outputs = np.asarray(outputs)
+        self.accelerate = outputs[:, 0] != 0
+        self.brake = outputs[:, 1] != 0
+        turn_left = outputs[:, 2] != 0
+        turn_right = outputs[:, 3] != 0
+        self.turn = np.where(turn_right, 1, np.where(turn_left, -1, 0)).astype(np.int8)
+
+    def place(self, x, y, heading):
+        # Moves the cars to (x, y) facing heading, in rotation_speed steps like update turns them
+        self.x[:] = x
+        self.y[:] = y
+        self.heading[:] = heading
+        self.angle[:] = self.heading*self.rotation_speed
+        rad = np.radians(self.angle)
+        self.direction[:, 0] = np.cos(rad)
+        self.direction[:, 1] = -np.sin(rad)
+
+    def update(self, outputs=None):
+        if outputs is not None:
+            self.controls(outputs)
+        alive = ~self.crashed
+
+        # Rotation, quantized headings like Car.update so directions never drift
+        turning = alive & (self.turn != 0)
+        if turning.any():
+            steps = int(round(360/self.rotation_speed))
+            heading = (self.heading[turning] - self.turn[turning]) % steps
+            self.heading[turning] = heading
+            self.angle[turning] = heading*self.rotation_speed
+            rad = np.radians(self.angle[turning])
+            self.direction[turning, 0] = np.cos(rad)
+            self.direction[turning, 1] = -np.sin(rad)
+
+        # Speed
+        speeding = alive & self.accelerate & (self.speed < self.top_speed)
+        breaking = alive & ~speeding & self.brake & (self.speed > 0.0)
+        coasting = alive & ~self.brake & ~self.accelerate
+        self.speed[speeding] += self.acceleration
+        self.speed[breaking] -= self.breaking_force
+        self.speed[coasting] -= self.desceleration
+        self.speed[alive & (self.speed <= 0.0)] = 0.0
+
+        self.x[alive] += self.direction[alive, 0]*self.speed[alive]
+        self.y[alive] += self.direction[alive, 1]*self.speed[alive]
+
+    def centers(self):
+        # Integer centers like Car.rect.center
+        return self.x.astype(np.int64), self.y.astype(np.int64)
+
+    def sensor_directions(self, angles):
+        # Unit vectors (size, len(angles), 2) rotated from each car's direction by angles in degrees
+        rad = np.radians(np.asarray(angles, dtype=np.float64))
+        cos = np.cos(rad)[None, :]
+        sin = np.sin(rad)[None, :]
+        dx = self.direction[:, 0:1]
+        dy = self.direction[:, 1:2]
+        return np.stack((dx*cos - dy*sin, dx*sin + dy*cos), axis=2)
@@ -0,0 +1,157 @@
+import json
+import sys
+import time
+import numpy as np
+from assets import ASSETS
+
+PHASES = ('events', 'rules', 'sensors', 'evolve', 'update', 'observers', 'draw')
+COUNTERS = ('collide_mask', 'mask_builds', 'blocks')  # blocks is the net change of allocated heap blocks
+WINDOW = 720  # Ticks kept for the rolling statistics
+PROFILE_PATH = 'profile.jsonl'
+
+
+class Null_Timer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+class Null_Profiler:
+    # Profiling switched off, every call is a no-op on shared objects
+    enabled = False
+    timer = Null_Timer()
+
+    def phase(self, name):
+        return self.timer
+
+    def counted(self, name, function):
+        return function
+
+    def count(self, name, n=1):
+        pass
+
+    def end_tick(self, tick):
+        pass
+
+    def close(self):
+        pass
+
+
+OFF = Null_Profiler()
+
+
+class Timer:
+    # Adds the time spent inside a with block to one phase of the current tick
+    __slots__ = ('current', 'index', 'start')
+
+    def __init__(self, current, index):
+        self.current = current
+        self.index = index
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        self.current[self.index] += time.perf_counter() - self.start
+        return False
+
+
+class Sink:
+    # Streams one row per tick to a .csv or .jsonl file
+    def __init__(self, path, columns):
+        self.path = path
+        self.columns = columns
+        self.csv = path.endswith('.csv')
+        self.file = open(path, 'w')
+        if self.csv:
+            self.file.write(','.join(columns)+'\n')
+
+    def write(self, values):
+        if self.csv:
+            self.file.write(','.join(repr(v) for v in values)+'\n')
+        else:
+            self.file.write(json.dumps(dict(zip(self.columns, values)))+'\n')
+
+    def close(self):
+        self.file.close()
+
+
+class Profiler:
+    # Seconds per phase and counter totals for every tick, the last window ticks are kept
+    # in ring buffers for rolling statistics. Phases that run between ticks, like drawing,
+    # go to the tick that ends next
+    enabled = True
+
+    def __init__(self, path=None, window=WINDOW, phases=PHASES, counters=COUNTERS):
+        self.phases = phases
+        self.counters = counters
+        self.current = np.zeros(len(phases))
+        self.counts = np.zeros(len(counters), dtype=np.int64)
+        self.times = np.zeros((window, len(phases)))
+        self.totals = np.zeros((window, len(counters)), dtype=np.int64)
+        self.timers = {name: Timer(self.current, k) for k, name in enumerate(phases)}
+        self.counter_index = {name: k for k, name in enumerate(counters)}
+        self.filled = 0
+        self.row = 0
+        self.mask_builds = ASSETS.mask_builds
+        self.blocks = sys.getallocatedblocks()
+        self.sink = Sink(path, ('tick',)+tuple(phases)+tuple(counters)) if path else None
+
+    def phase(self, name):
+        return self.timers[name]
+
+    def count(self, name, n=1):
+        self.counts[self.counter_index[name]] += n
+
+    def counted(self, name, function):
+        # function wrapped to count its calls
+        index = self.counter_index[name]
+        counts = self.counts
+
+        def wrapper(*args):
+            counts[index] += 1
+            return function(*args)
+        return wrapper
+
+    def end_tick(self, tick):
+        builds = ASSETS.mask_builds
+        self.count('mask_builds', builds - self.mask_builds)
+        self.mask_builds = builds
+        blocks = sys.getallocatedblocks()
+        self.count('blocks', blocks - self.blocks)
+        self.blocks = blocks
+
+        self.times[self.row] = self.current
+        self.totals[self.row] = self.counts
+        if self.sink is not None:
+            self.sink.write([tick] + self.current.tolist() + self.counts.tolist())
+        self.current[:] = 0
+        self.counts[:] = 0
+        self.row = (self.row + 1) % len(self.times)
+        self.filled = min(self.filled + 1, len(self.times))
+
+    def stats(self):
+        # {phase: (mean ms, p95 ms, max ms)} and {counter: mean per tick} over the window
+        if not self.filled:
+            return {}, {}
+        times = self.times[:self.filled]*1000
+        mean = times.mean(axis=0)
+        p95 = np.percentile(times, 95, axis=0)
+        peak = times.max(axis=0)
+        phases = {name: (mean[k], p95[k], peak[k]) for k, name in enumerate(self.phases)}
+        counts = self.totals[:self.filled].mean(axis=0)
+        return phases, {name: counts[k] for k, name in enumerate(self.counters)}
+
+    def histogram(self, name=None, bins=16):
+        # Rolling histogram of one phase's ms per tick, or of the whole tick when name is None
+        times = self.times[:self.filled]*1000
+        values = times.sum(axis=1) if name is None else times[:, self.phases.index(name)]
+        return np.histogram(values, bins=bins)
+
+    def close(self):
+        if self.sink is not None:
+            self.sink.close()
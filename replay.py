@@ -0,0 +1,146 @@
+import json
+import os
+import numpy as np
+
+REPLAY_VERSION = 2
+
+
+def controls_of(car):
+    # accelerate, brake, turn left and turn right of one tick as 4 bits
+    return (bool(car.accelerate) | bool(car.brake) << 1 |
+            bool(car.turn_left) << 2 | bool(car.turn_right) << 3)
+
+
+def unpack_controls(bits):
+    # (..., 4) uint8 of 0 and 1 in Car.controls order
+    return ((bits[..., None] >> np.arange(4, dtype=np.uint8)) & 1).astype(np.uint8)
+
+
+def genome_of(car):
+    return np.concatenate([np.ravel(v) for v in (car.dense1.weights, car.dense1.biases,
+                                                  car.dense2.weights, car.dense2.biases)])
+
+
+def state_of(population):
+    # Where a generation ended, compared bit for bit on playback
+    return np.array([(c.x, c.y, c.passed) for c in population], dtype=np.float64)
+
+
+class Replay_Recorder:
+    # Simulation observer that records a run: its seed, every generation's genomes, the controls
+    # each car used on every tick as 4 bits and where every generation ended. Generations that
+    # replaced the population between ticks, restart() or load_brain(), also get the tick,
+    # check tick and generation number the simulation had then
+    def __init__(self, path, seed, meta=None):
+        self.path = path
+        self.seed = seed
+        self.meta = meta or {}
+        self.population = None
+        self.controls = []
+        self.starts = []
+        self.genomes = []
+        self.states = []
+        self.resets = []
+        self.clocks = []
+
+    def __call__(self, sim):
+        # By identity, restarting or loading can leave the generation number as it was
+        if sim.population is not self.population:
+            if self.population is not None:
+                self.states.append(state_of(self.population))
+            start_population, tick, check_tick, generation = sim.step_start
+            self.resets.append(start_population is not self.population)
+            self.clocks.append((tick, check_tick, generation))
+            self.population = sim.population
+            self.starts.append(len(self.controls))
+            self.genomes.append(np.stack([genome_of(c) for c in self.population]))
+        self.controls.append(np.fromiter((controls_of(c) for c in self.population),
+                                         dtype=np.uint8, count=len(self.population)))
+
+    def close(self):
+        if self.population is None:
+            return
+        self.states.append(state_of(self.population))
+        meta = dict(self.meta, version=REPLAY_VERSION, seed=self.seed,
+                    genome_shapes=[list(np.shape(v)) for v in (
+                        self.population[0].dense1.weights, self.population[0].dense1.biases,
+                        self.population[0].dense2.weights, self.population[0].dense2.biases)])
+        temp_path = self.path+'.tmp.npz'
+        np.savez_compressed(temp_path, meta=np.array(json.dumps(meta)),
+                            controls=np.stack(self.controls), starts=np.array(self.starts),
+                            genomes=np.stack(self.genomes), states=np.stack(self.states),
+                            resets=np.array(self.resets), clocks=np.array(self.clocks, dtype=np.int64))
+        os.replace(temp_path, self.path)
+
+
+class Replay_Player:
+    # Simulation driver that plays a replay back: every generation gets the recorded genomes
+    # and every car the recorded controls instead of its network's. Each generation has to
+    # start on the recorded tick and end in the recorded state, differences go to mismatches
+    def __init__(self, path):
+        with np.load(path) as data:
+            self.meta = json.loads(str(data['meta']))
+            if self.meta['version'] > REPLAY_VERSION:
+                raise ValueError('Replay '+path+' has version '+str(self.meta['version']) +
+                                 ', newest known is '+str(REPLAY_VERSION))
+            self.controls = unpack_controls(data['controls'])
+            self.starts = data['starts']
+            self.genomes = data['genomes']
+            self.states = data['states']
+            # Version 1 replays only have generations that evolve() started
+            self.resets = data['resets'] if 'resets' in data else np.zeros(len(self.starts), dtype=bool)
+            self.clocks = data['clocks'] if 'clocks' in data else None
+        self.seed = self.meta['seed']
+        self.tick = 0
+        self.segment = -1
+        self.population = None
+        self.mismatches = []
+
+    @property
+    def done(self):
+        return self.tick >= len(self.controls)
+
+    def check(self):
+        if self.population is not None and not np.array_equal(
+                state_of(self.population), self.states[self.segment]):
+            self.mismatches.append(('state', self.segment, self.tick))
+
+    def install(self, population):
+        shapes = [tuple(s) for s in self.meta['genome_shapes']]
+        for car, genome in zip(population, self.genomes[self.segment]):
+            values = []
+            start = 0
+            for shape in shapes:
+                size = int(np.prod(shape))
+                values.append(genome[start:start + size].reshape(shape))
+                start += size
+            car.dense1.inherit_WB(values[0], values[1])
+            car.dense2.inherit_WB(values[2], values[3])
+
+    def prepare(self, sim):
+        # Call before every step, restarts the simulation where the recording restarted or
+        # loaded a brain between ticks. The recorded genomes replace the new cars' anyway
+        k = self.segment + 1
+        if 0 < k < len(self.starts) and self.resets[k] and self.starts[k] == self.tick:
+            tick, check_tick, generation = (int(v) for v in self.clocks[k])
+            sim.restart(generation)
+            sim.tick = tick
+            sim.check_tick = check_tick
+
+    def __call__(self, sim):
+        if sim.population is not self.population:
+            self.check()
+            self.segment += 1
+            if self.segment >= len(self.starts) or self.starts[self.segment] != self.tick:
+                self.mismatches.append(('generation', self.segment, self.tick))
+            self.population = sim.population
+            if self.segment < len(self.genomes):
+                self.install(self.population)
+        for car, controls in zip(self.population, self.controls[self.tick]):
+            car.controls = controls
+        self.tick += 1
+
+    def finish(self):
+        # Checks the last generation, call once done
+        self.check()
+        return not self.mismatches
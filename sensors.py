@@ -0,0 +1,97 @@
+import numpy as np
+import masks
+
+SENS_LEN = 240
+SENS_ANGLES = (0.0, -45.0, 45.0)  # Front, left and right, degrees from the car's direction
+SENS_MISS = SENS_LEN + SENS_LEN/8  # Same no detection value as main.Car
+FIELD_CAP = 16  # Distance field saturates here, rays never step further at once
+SQRT2 = np.sqrt(2.0)
+EDGE_STEP = 1e-6  # Past a pixel edge, far enough to land in the next pixel
+
+
+def distance_field(occupied, cap=FIELD_CAP):
+    # Euclidean distance from every pixel to the nearest occupied one, exact up to cap.
+    # Everything outside the image is occupied, like Ray_Sensors.sample treats it
+    occupied = np.pad(np.asarray(occupied, dtype=bool), cap + 1, constant_values=True)
+    h, w = occupied.shape
+    cols = np.arange(w)
+    left = np.maximum.accumulate(np.where(occupied, cols, -(w + cap)), axis=1)
+    right = np.minimum.accumulate(
+        np.where(occupied, cols, 2*w + cap)[:, ::-1], axis=1)[:, ::-1]
+    row = np.minimum(np.minimum(cols - left, right - cols), cap + 1)
+    row2 = (row*row).astype(np.float32)
+    d2 = row2.copy()
+    for dy in range(1, cap + 1):
+        np.minimum(d2[dy:], row2[:-dy] + dy*dy, out=d2[dy:])
+        np.minimum(d2[:-dy], row2[dy:] + dy*dy, out=d2[:-dy])
+    return np.minimum(np.sqrt(d2), cap).astype(np.float32)[cap + 1:-(cap + 1), cap + 1:-(cap + 1)]
+
+
+class Ray_Sensors:
+    # Sphere traces every ray of every car against the track's distance field at once
+    def __init__(self, occupied, angles=SENS_ANGLES, length=SENS_LEN, miss_distance=SENS_MISS, cap=FIELD_CAP, field=None):
+        self.field = distance_field(occupied, cap) if field is None else field
+        self.height, self.width = self.field.shape
+        self.angles = np.asarray(angles, dtype=np.float64)
+        self.length = length
+        self.miss_distance = miss_distance
+
+    @classmethod
+    def from_track(cls, track_n, cap=FIELD_CAP, **kwargs):
+        # Mask and distance field come from the shared on-disk cache
+        path = 'track'+str(track_n)+'.png'
+        occupied = masks.cached_mask(path)
+        field = masks.cached(path, 'field'+str(cap)+'-walled',
+                             lambda: distance_field(occupied, cap))
+        return cls(occupied, cap=cap, field=field, **kwargs)
+
+    def sample(self, px, py):
+        # Field value under each point, anything outside the image counts as track
+        ix = np.floor(px).astype(np.int64)
+        iy = np.floor(py).astype(np.int64)
+        inside = (ix >= 0) & (ix < self.width) & (iy >= 0) & (iy < self.height)
+        d = np.zeros(px.shape, dtype=np.float32)
+        d[inside] = self.field[iy[inside], ix[inside]]
+        return d
+
+    def cast(self, x, y, directions):
+        # x, y (n,) ray origins, directions (n, rays, 2) unit vectors -> distances (n, rays)
+        n, rays = directions.shape[:2]
+        ox = np.repeat(np.asarray(x, dtype=np.float64), rays)
+        oy = np.repeat(np.asarray(y, dtype=np.float64), rays)
+        dx = directions[:, :, 0].ravel()
+        dy = directions[:, :, 1].ravel()
+        t = np.zeros(n*rays)
+        distances = np.full(n*rays, self.miss_distance, dtype=np.float64)
+        active = np.arange(n*rays)
+        # Ray length to cross one pixel along each axis, inf along an axis the ray runs parallel to
+        with np.errstate(divide='ignore'):
+            cross_x = 1/np.abs(dx)
+            cross_y = 1/np.abs(dy)
+        while active.size:
+            ta = t[active]
+            px = ox[active] + dx[active]*ta
+            py = oy[active] + dy[active]*ta
+            d = self.sample(px, py)
+            hit = d == 0
+            distances[active[hit]] = ta[hit]
+            # Field distances are between pixels, a sample point and the track pixel can
+            # each sit up to sqrt(2)/2 away from theirs. Close to the track the ray walks
+            # into the next pixel it crosses instead, so it never skips a corner
+            # Going backwards from exactly on an edge is a whole pixel, not 0, else a ray
+            # almost parallel to that edge would never get off it
+            to_x = np.where(dx[active] > 0, np.floor(px) + 1 - px, px - np.ceil(px) + 1)
+            to_y = np.where(dy[active] > 0, np.floor(py) + 1 - py, py - np.ceil(py) + 1)
+            # 0*inf is nan on a parallel axis, fmin takes the other one
+            with np.errstate(invalid='ignore'):
+                edge = np.fmin(to_x*cross_x[active], to_y*cross_y[active])
+            ta = ta + np.maximum(d - SQRT2, edge + EDGE_STEP)
+            t[active] = ta
+            active = active[~hit & (ta < self.length)]
+        return distances.reshape(n, rays)
+
+    def sense(self, population, cars=slice(None)):
+        # Distances (len(cars), rays) for the cars of a population.Population picked by cars,
+        # an index or mask, every car by default
+        return self.cast(population.x[cars], population.y[cars],
+                         population.sensor_directions(self.angles)[cars])
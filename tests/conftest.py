@@ -0,0 +1,5 @@
+import os
+
+# Simulation and the asset caches need pygame, without a window or sound
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
@@ -0,0 +1,94 @@
+import threading
+import time
+import numpy as np
+import pytest
+import neuralnet as nn
+
+SAMPLES = 128  # 4 batches, more than prefetch can hold
+BATCH_SIZE = 32
+TIMEOUT = 10  # Seconds before a call counts as hung
+FILL = 0.5  # Seconds the consumer waits so the producer has filled the queue and blocks
+
+
+def finishes(function):
+    # Runs function on a thread, returns (finished, type of the exception raised) so a deadlock
+    # fails the test instead of hanging the run. Only the type is kept, the traceback would keep
+    # the loader's generator alive and skip its cleanup
+    raised = []
+
+    def target():
+        try:
+            function()
+        except Exception as error:
+            raised.append(type(error))
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    thread.join(TIMEOUT)
+    return not thread.is_alive(), raised[0] if raised else None
+
+
+@pytest.fixture
+def data():
+    rng = np.random.default_rng(0)
+    return rng.standard_normal((SAMPLES, 2)), rng.integers(0, 3, SAMPLES)
+
+
+@pytest.mark.parametrize('prefetch', [0, 2])
+def test_every_sample_once(data, prefetch):
+    X, y = data
+    loader = nn.Batch_Loader((X, y), BATCH_SIZE, prefetch=prefetch, rng=np.random.default_rng(0))
+    seen = np.concatenate([batch_X for batch_X, _ in loader])
+    assert len(seen) == SAMPLES
+    np.testing.assert_array_equal(np.sort(seen, axis=0), np.sort(X, axis=0))
+
+
+def test_break_out_early(data):
+    loader = nn.Batch_Loader(data, BATCH_SIZE, prefetch=2, rng=np.random.default_rng(0))
+
+    def consume():
+        for k, _ in enumerate(loader):
+            if k == 1:
+                time.sleep(FILL)
+                break
+    assert finishes(consume) == (True, None)
+
+
+def test_close_early(data):
+    loader = nn.Batch_Loader(data, BATCH_SIZE, prefetch=2, rng=np.random.default_rng(0))
+
+    def consume():
+        batches = iter(loader)
+        next(batches)
+        next(batches)
+        time.sleep(FILL)
+        batches.close()
+    assert finishes(consume) == (True, None)
+
+
+def test_source_error_is_raised(data):
+    def chunks():
+        yield data
+        raise OSError('chunk missing')
+    loader = nn.Batch_Loader(chunks, BATCH_SIZE, prefetch=1, rng=np.random.default_rng(0))
+    finished, error = finishes(lambda: list(loader))
+    assert finished
+    assert error is OSError
+
+
+def test_train_raises_error_from_forward(data):
+    # 3 batches, the producer is left blocking on its end of data marker
+    X, y = data
+    data = X[:3*BATCH_SIZE], y[:3*BATCH_SIZE]
+
+    class Broken_Layer(nn.Activation_ReLU):
+        def forward(self, inputs):
+            time.sleep(FILL)
+            raise ValueError('broken layer')
+    model = nn.Model()
+    model.add(nn.Layer_Dense(2, 3, rng=np.random.default_rng(0)))
+    model.add(Broken_Layer())
+    model.set(nn.Loss_CatergoricalCrossentropy(), nn.Optimizer_SGD())
+    finished, error = finishes(lambda: model.train(data, batch_size=BATCH_SIZE, print_every=0,
+                                                   rng=np.random.default_rng(0)))
+    assert finished
+    assert error is ValueError
@@ -0,0 +1,16 @@
+import numpy as np
+import pytest
+import collision
+from assets import ASSETS
+from population import ROTATION_SPEED
+
+SAMPLES = 2000
+
+
+@pytest.mark.parametrize('track_n', [1, 2])
+def test_kernel_matches_collide_mask(track_n):
+    orientations = ASSETS.orientations('car.png', ROTATION_SPEED)
+    wrong, hits = collision.verify(track_n, orientations, SAMPLES, np.random.default_rng(track_n))
+    assert wrong == 0
+    # Half the poses sit on the track lines, so plenty of them have to collide
+    assert hits > SAMPLES//4
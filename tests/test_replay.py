@@ -0,0 +1,36 @@
+import main
+import replay
+
+SEED = 3
+SIZE = 20
+TICKS = 40
+
+
+def record(path, between=()):
+    # TICKS ticks, then each of between on the simulation followed by TICKS more
+    sim = main.Simulation(SEED, size=SIZE)
+    recorder = replay.Replay_Recorder(str(path), SEED, {'size': SIZE})
+    sim.attach(recorder)
+    for _ in range(TICKS):
+        sim.step()
+    for action in between:
+        action(sim)
+        for _ in range(TICKS):
+            sim.step()
+    recorder.close()
+    return sim
+
+
+def test_round_trip_is_bit_exact(tmp_path):
+    record(tmp_path/'run.npz')
+    assert main.play(str(tmp_path/'run.npz'))
+
+
+def test_restarts_keeping_the_generation_number(tmp_path):
+    # R twice restarts at generation 0 both times
+    restart = main.Simulation.restart
+    record(tmp_path/'run.npz', (restart, restart))
+    player = replay.Replay_Player(str(tmp_path/'run.npz'))
+    assert len(player.starts) == 3
+    assert list(player.starts) == [0, TICKS, 2*TICKS]
+    assert main.play(str(tmp_path/'run.npz'))
@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+import masks
+import sensors
+
+CARS = 200
+STEP = 0.01  # Reference marcher step, pixels
+
+
+def march(ray_sensors, x, y, directions, step=STEP):
+    # First sample along each ray that lands on the track, every step pixels
+    distances = np.full(directions.shape[:2], ray_sensors.miss_distance)
+    for t in np.arange(0, ray_sensors.length, step):
+        px = x[:, None] + directions[..., 0]*t
+        py = y[:, None] + directions[..., 1]*t
+        hit = (ray_sensors.sample(px.ravel(), py.ravel()) == 0).reshape(distances.shape)
+        first = hit & (distances == ray_sensors.miss_distance)
+        distances[first] = t
+    return distances
+
+
+@pytest.mark.parametrize('track_n', [1, 2])
+def test_cast_matches_marcher(track_n):
+    rng = np.random.default_rng(track_n)
+    ray_sensors = sensors.Ray_Sensors.from_track(track_n)
+    # Anywhere off the track lines, at any angle
+    ys, xs = np.nonzero(~np.asarray(masks.cached_mask('track'+str(track_n)+'.png')))
+    k = rng.integers(0, ys.size, CARS)
+    x = xs[k] + rng.random(CARS)
+    y = ys[k] + rng.random(CARS)
+    angles = rng.uniform(0, 2*np.pi, (CARS, len(sensors.SENS_ANGLES)))
+    directions = np.stack((np.cos(angles), np.sin(angles)), axis=-1)
+
+    cast = ray_sensors.cast(x, y, directions)
+    marched = march(ray_sensors, x, y, directions)
+    miss = ray_sensors.miss_distance
+    np.testing.assert_array_equal(cast == miss, marched == miss)
+    hit = cast != miss
+    assert hit.any()
+    # The marcher stops up to one step past the exact distance, cast up to EDGE_STEP past it
+    assert np.all(marched[hit] - cast[hit] >= -sensors.EDGE_STEP)
+    assert np.all(marched[hit] - cast[hit] <= STEP + 1e-9)
@@ -0,0 +1,87 @@
+import numpy as np
+import pytest
+import neuralnet as nn
+
+SAMPLES = 64
+CLASSES = 5
+EPSILON = 1e-6
+
+
+def softmax_jacobian_backward(output, dvalues):
+    # Per sample Jacobian, the reference Activation_Softmax.backward is checked against
+    dinputs = np.empty_like(dvalues)
+    for index, (single_output, single_dvalues) in enumerate(zip(output, dvalues)):
+        single_output = single_output.reshape(-1, 1)
+        jacobian_matrix = np.diagflat(
+            single_output) - np.dot(single_output, single_output.T)
+        dinputs[index] = np.dot(jacobian_matrix, single_dvalues)
+    return dinputs
+
+
+@pytest.fixture
+def rng():
+    return np.random.default_rng(0)
+
+
+@pytest.fixture
+def batch(rng):
+    logits = rng.standard_normal((SAMPLES, CLASSES))
+    y_true = rng.integers(0, CLASSES, SAMPLES)
+    return logits, y_true
+
+
+@pytest.mark.parametrize('dtype, tolerance', [(np.float64, 1e-12), (np.float32, 1e-6)])
+def test_softmax_backward_matches_jacobian(rng, batch, dtype, tolerance):
+    logits, _ = batch
+    softmax = nn.Activation_Softmax()
+    softmax.forward(logits.astype(dtype))
+    dvalues = rng.standard_normal((SAMPLES, CLASSES)).astype(dtype)
+    softmax.backward(dvalues)
+    assert softmax.dinputs.dtype == dtype
+    np.testing.assert_allclose(softmax.dinputs, softmax_jacobian_backward(softmax.output, dvalues),
+                               rtol=0, atol=tolerance)
+
+
+def test_fused_matches_separate_backwards(batch):
+    logits, y_true = batch
+    softmax = nn.Activation_Softmax()
+    loss = nn.Loss_CatergoricalCrossentropy()
+    fused = nn.Activation_Softmax_Loss_CategoricalCrossentropy.fuse(softmax, loss)
+    fused.forward(logits, y_true)
+    fused.backward(fused.output, y_true)
+    loss.backward(softmax.output, y_true)
+    softmax.backward(loss.dinputs)
+    np.testing.assert_allclose(fused.dinputs, softmax.dinputs, rtol=0, atol=1e-12)
+
+
+def test_fused_one_hot_labels(batch):
+    logits, y_true = batch
+    fused = nn.Activation_Softmax_Loss_CategoricalCrossentropy()
+    fused.forward(logits, y_true)
+    fused.backward(fused.output, y_true)
+    sparse = fused.dinputs
+    fused.backward(fused.output, np.eye(CLASSES)[y_true])
+    np.testing.assert_array_equal(fused.dinputs, sparse)
+
+
+def test_fused_matches_finite_differences(batch):
+    logits, y_true = batch
+    fused = nn.Activation_Softmax_Loss_CategoricalCrossentropy()
+    fused.forward(logits, y_true)
+    fused.backward(fused.output, y_true)
+    numeric = np.empty_like(logits)
+    for index in np.ndindex(logits.shape):
+        shifted = logits.copy()
+        shifted[index] += EPSILON
+        up = fused.forward(shifted, y_true)
+        shifted[index] -= 2 * EPSILON
+        down = fused.forward(shifted, y_true)
+        numeric[index] = (up - down) / (2 * EPSILON)
+    np.testing.assert_allclose(numeric, fused.dinputs, rtol=0, atol=1e-8)
+
+
+def test_fuse_only_softmax_into_crossentropy():
+    assert nn.Activation_Softmax_Loss_CategoricalCrossentropy.fuse(
+        nn.Activation_Sigmoid(), nn.Loss_CatergoricalCrossentropy()) is None
+    assert nn.Activation_Softmax_Loss_CategoricalCrossentropy.fuse(
+        nn.Activation_Softmax(), nn.Loss_BinaryCrossentropy()) is None